@@ -1,273 +1,668 @@
 from __future__ import annotations
-from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 import os
-import re
 import io
-import fitz  # PyMuPDF
-from datetime import datetime, timedelta, date
-from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify
+import json
+import sqlite3
+from collections import deque
+from functools import partial, wraps
+from flask import (
+    Flask, Response, render_template, request, redirect, url_for, send_file, jsonify,
+    make_response, stream_with_context,
+)
 from io import BytesIO
 
-app = Flask(__name__)
-
-TIME_RGX = re.compile(
-    r"^\s*(\d{1,2}):(\d{2})\s*([ap]m)\s*[-–—]\s*(\d{1,2}):(\d{2})\s*([ap]m)\s*$",
-    re.IGNORECASE,
+from assets import DecompressMiddleware, StaticAssets, install_compression
+from batch import PdfMerger, ZipStream, iter_ndjson, ordered_map, safe_name
+from browser_pool import browser_pool
+from importers import iter_csv, iter_ics, text_stream
+from imaging import EXTENSIONS, ImageOptions, image_options, rasterize
+from jobs import job_queue
+from live import LiveTotals
+from metrics import install as install_metrics, metrics, observe_bytes, stage
+from pdf_renderer import WeasyRenderer
+from render_cache import render_cache
+from store import TimesheetStore
+from timesheet import (  # noqa: F401 — реэкспорт для старых импортов
+    TIME_RGX, Timesheet, day_name, make_period_title, parse_date, parse_range, to_24h,
 )
 
+app = Flask(__name__)
+# лимит тела запроса (после распаковки gzip); 0 — без лимита
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", 64 << 20)) or None
+app.wsgi_app = DecompressMiddleware(app)
+install_metrics(app)
+install_compression(app, int(os.environ.get("COMPRESS_MIN_BYTES", 1024)))
 
-def to_24h(hour12: int, minute: int, ampm: str) -> tuple[int, int]:
-    ampm = ampm.lower()
-    h = hour12 % 12
-    if ampm == "pm":
-        h += 12
-    return h, minute
-
-
-def parse_range(date_obj: datetime, rng: str, tz: ZoneInfo) -> tuple[datetime, datetime, int, int, bool]:
-    m = TIME_RGX.match(rng)
-    if not m:
-        raise ValueError("Time range must be like '3:52 pm - 1:11 am'")
-    sh, sm, sa, eh, em, ea = m.groups()
-    sh, sm, eh, em = int(sh), int(sm), int(eh), int(em)
-    sh24, sm = to_24h(sh, sm, sa)
-    eh24, em = to_24h(eh, em, ea)
-
-    start_local = datetime(date_obj.year, date_obj.month, date_obj.day, sh24, sm, tzinfo=tz)
-    end_local   = datetime(date_obj.year, date_obj.month, date_obj.day, eh24, em, tzinfo=tz)
-    if end_local <= start_local:
-        end_local += timedelta(days=1)
-
-    minutes_total = int(
-        (end_local.astimezone(ZoneInfo("UTC")) - start_local.astimezone(ZoneInfo("UTC"))).total_seconds() // 60
-    )
-    h, m = divmod(minutes_total, 60)
-
-    dst_adjusted = start_local.utcoffset() != end_local.utcoffset()
-    return start_local, end_local, h, m, dst_adjusted
+static_assets = StaticAssets.from_env(app.static_folder)
+static_assets.install(app)
 
+timesheet_store = TimesheetStore.from_env()  # None, пока не задан TIMESHEET_DB
+live_totals = LiveTotals.from_env()
+weasy_renderer = WeasyRenderer.from_env(app.static_folder, app.static_url_path, static_assets.logical)
 
-def day_name(dt: datetime) -> str:
-    return dt.strftime("%A")
 
+@app.errorhandler(413)
+def payload_too_large(e):
+    return jsonify({"error": "payload_too_large", "max_bytes": app.config["MAX_CONTENT_LENGTH"]}), 413
 
-def _fmt_month_day(d: date) -> str:
-    return f"{d.strftime('%B')} {d.strftime('%d').lstrip('0')}"
 
+def _draft_timesheet(draft: dict) -> tuple[str, str, int, Timesheet]:
+    last_name  = (draft.get("last_name") or "").strip()
+    first_name = (draft.get("first_name") or "").strip()
+    year       = int(draft.get("year") or 0)
+    return first_name, last_name, year, Timesheet.from_draft_rows(draft.get("tz"), draft.get("rows") or [])
 
-def make_period_title(dates: list[date]) -> str:
-    """
-    'October 25 – 31, 2025' | 'October 25 – November 3, 2025' | 'October 25, 2025 – November 3, 2026'
-    """
-    lo, hi = min(dates), max(dates)
-    if lo.year == hi.year:
-        if lo.month == hi.month:
-            return f"{_fmt_month_day(lo)} – {hi.strftime('%d').lstrip('0')}, {lo.year}"
-        return f"{_fmt_month_day(lo)} – {_fmt_month_day(hi)}, {lo.year}"
-    return f"{_fmt_month_day(lo)}, {lo.year} – {_fmt_month_day(hi)}, {hi.year}"
 
 def _make_context_from_draft(draft: dict) -> dict:
     """Собираем context так же, как в /build, из приходящего draft"""
-    last_name  = (draft.get("last_name") or "").strip()
-    first_name = (draft.get("first_name") or "").strip()
-    year       = int(draft.get("year") or 0)
-    tz_name    = (draft.get("tz") or "").strip() or os.environ.get("DEFAULT_TZ", "America/Chicago")
+    first_name, last_name, year, ts = _draft_timesheet(draft)
+    return ts.context(first_name, last_name, year)
+
+
+def _save_timesheet(first_name: str, last_name: str, ts: Timesheet) -> dict | None:
+    # хранилище — побочный эффект: его ошибка не должна ломать отчёт
+    if timesheet_store is None:
+        return None
     try:
-        tz = ZoneInfo(tz_name)
-    except ZoneInfoNotFoundError:
-        tz = ZoneInfo("America/Chicago")
-
-    rows_src = draft.get("rows") or []
-    rows = []
-    for row in rows_src:
-        d_str = (row.get("date") or "").strip()
-        s_str = (row.get("start") or "").strip()
-        e_str = (row.get("end") or "").strip()
-        if not (d_str and s_str and e_str):
-            continue
-        # формируем скрытое поле range в точности как на форме
-        rng = f"{_to_ampm(s_str)} - {_to_ampm(e_str)}"
-        if not re.match(r"^\d{4}-\d{2}-\d{2}$", d_str):
-            continue
-        base_date = datetime.strptime(d_str, "%Y-%m-%d")
-        try:
-            start, end, hh, mm, dst_adjusted = parse_range(base_date, rng, tz)
-        except ValueError:
-            continue
-        rows.append({
-            "date": base_date.strftime("%m/%d/%Y"),
-            "day":  day_name(base_date),
-            "time_label": f"{start.strftime('%I:%M %p').lstrip('0').lower()} – {end.strftime('%I:%M %p').lstrip('0').lower()}",
-            "h": hh,
-            "m": f"{mm:02d}",
-            "dst": dst_adjusted,
-        })
-
-    rows.sort(key=lambda r: datetime.strptime(r["date"], "%m/%d/%Y"))
-    dates_for_title = [datetime.strptime(r["date"], "%m/%d/%Y").date() for r in rows]
-    if dates_for_title:
-        period_title = make_period_title(dates_for_title)
-        title_str = f"{first_name} {last_name} — Work Hours ({period_title})"
-    else:
-        title_str = f"{first_name} {last_name} — Work Hours ({year})"
+        return timesheet_store.save_timesheet(first_name, last_name, ts)
+    except sqlite3.Error:
+        app.logger.exception("timesheet store: save failed")
+        return None
 
-    subtotal_h = sum(r["h"] for r in rows)
-    subtotal_m = sum(int(r["m"]) for r in rows)
-    m_to_h, m_rem = divmod(subtotal_m, 60)
-    total_h = subtotal_h + m_to_h
-    total_m = m_rem
-    dst_note = any(r["dst"] for r in rows)
+# ---------- render helpers ----------
+# цепочка рендереров входит в ключ кэша: поменяли её — старые артефакты не годятся
+PDF_RENDERER = "weasyprint>playwright"
+RASTER_DPI = 200  # 300 для ещё резче
+IMAGE_PARALLEL_PAGES = int(os.environ.get("IMAGE_PARALLEL_PAGES", 4))
+GENERATED_AT_MARK = "@@generated_at@@"
 
-    return {
-        "title": title_str,
-        "last_name": last_name,
-        "first_name": first_name,
-        "year": year,
-        "rows": rows,
-        "subtotal_h": subtotal_h,
-        "subtotal_m": subtotal_m,
-        "subtotal_m_as_h": m_to_h,
-        "subtotal_m_rem": m_rem,
-        "total_h": total_h,
-        "total_m": f"{total_m:02d}",
-        "dst_note": dst_note,
-        "tz_name": tz_name,
-        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-    }
 
-def _to_ampm(hhmm: str) -> str:
-    h, m = map(int, hhmm.split(":"))
-    ap = "pm" if h >= 12 else "am"
-    h12 = ((h + 11) % 12) + 1
-    return f"{h12}:{str(m).zfill(2)} {ap}"
+def _inject_base(html: str) -> str:
+    # чтобы относительные ссылки на CSS/картинки работали
+    with stage("html_prep"):
+        base = request.url_root
+        return html.replace("<head>", f"<head><base href='{base}'>", 1)
 
-@app.route("/export-image", methods=["POST"])
-def export_image():
-    html = request.form.get("html")
-    if not html:
-        return jsonify({"error": "missing_html"}), 400
 
-    # Вставим <base>, чтобы относительные url (CSS/картинки) работали
-    base = request.url_root
-    html_with_base = html.replace("<head>", f"<head><base href='{base}'>", 1)
+def _render_pdf(html_with_base: str, key: str | None = None) -> tuple[bytes | None, dict]:
+    """HTML -> PDF: WeasyPrint, затем Playwright из пула. Промежуточный PDF кэшируется (key — готовый ключ)."""
+    key = key or render_cache.key(html_with_base, "pdf", renderer=PDF_RENDERER)
+    pdf_bytes = render_cache.get(key)
+    if pdf_bytes is not None:
+        metrics.inc("wh_renderer_total", renderer="cache")
+        return pdf_bytes, {}
 
-    pdf_bytes = None
     weasy_err = None
+    renderer = "weasyprint"
 
-    # 1) Пытаемся WeasyPrint
+    # 1) Пытаемся через WeasyPrint (если установлены зависимости)
     try:
-        from weasyprint import HTML
-        pdf_bytes = HTML(string=html_with_base).write_pdf()
+        with stage("weasyprint"):
+            pdf_bytes = weasy_renderer.render_pdf(html_with_base)
     except Exception as e:
         weasy_err = str(e)
+        metrics.inc("wh_render_fallback_total", reason=type(e).__name__)
 
-    # 2) Фолбэк на Playwright, если WeasyPrint не сработал
+    # 2) Фолбэк: Playwright из пула, если WeasyPrint недоступен
     if pdf_bytes is None:
+        renderer = "playwright"
         try:
-            from playwright.sync_api import sync_playwright
-            with sync_playwright() as p:
-                browser = p.chromium.launch()
-                page = browser.new_page()
-                page.set_content(html_with_base, wait_until="load")
-                pdf_bytes = page.pdf(
-                    format="Letter",
-                    print_background=True,
-                    prefer_css_page_size=True
-                )
-                browser.close()
+            with stage("playwright"):
+                pdf_bytes = browser_pool.render_pdf(html_with_base)
         except Exception as e:
-            return jsonify({
-                "error": "render_failed",
-                "weasyprint": weasy_err,
-                "playwright": str(e)
-            }), 500
+            metrics.inc("wh_render_errors_total", stage="playwright", reason=type(e).__name__)
+            return None, {"weasyprint": weasy_err, "playwright": str(e)}
+
+    metrics.inc("wh_renderer_total", renderer=renderer)
+    observe_bytes("pdf", len(pdf_bytes))
+    render_cache.put(key, pdf_bytes)
+    return pdf_bytes, {}
+
+
+def warm_renderers() -> None:
+    """Тяжёлые импорты, чтение style.css и браузеры заранее (gunicorn post_fork), а не на первом экспорте."""
+    import fitz  # noqa: F401 — PyMuPDF, только прогрев импорта
+    try:
+        weasy_renderer.load()
+    except Exception as e:
+        # без pango/cairo WeasyPrint не поднимется — останется Playwright
+        app.logger.info("weasyprint unavailable: %s", e)
+    if os.environ.get("BROWSER_PREWARM", "1") == "1":
+        try:
+            # Chromium слотов стартует сейчас, а не на первом фолбэке
+            browser_pool.start()
+        except ImportError:
+            pass  # playwright не установлен — прогревать нечего
+
+
+def _rasterize(pdf_bytes: bytes, opts: ImageOptions) -> bytes:
+    # многостраничные документы режем на страницы в процессах пула пачек
+    with stage("rasterize"):
+        data = rasterize(pdf_bytes, opts, pool=_get_batch_executor, parallel_min_pages=IMAGE_PARALLEL_PAGES)
+    observe_bytes("image", len(data))
+    return data
+
+
+def _make_artifact(html_with_base: str, opts: ImageOptions | None, key: str,
+                   pdf_key: str | None = None) -> tuple[bytes | None, dict]:
+    """Рендер + растеризация с кэшем; без request-контекста, годится для фоновых заданий."""
+    data = render_cache.get(key) if opts is not None else None
+    if data is not None:
+        return data, {}
+
+    pdf_bytes, errors = _render_pdf(html_with_base, key if opts is None else pdf_key)
+    if pdf_bytes is None:
+        return None, {"error": "render_failed", **errors}
+    if opts is None:
+        return pdf_bytes, {}
 
-    # 3) PDF -> PNG через PyMuPDF
     try:
-        
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        page = doc[0]
-        pix = page.get_pixmap(dpi=200)  # можно 300 для еще резче
-        img_bytes = pix.tobytes("png")
+        data = _rasterize(pdf_bytes, opts)
     except Exception as e:
-        return jsonify({"error": "pdf_to_png_failed", "detail": str(e)}), 500
+        metrics.inc("wh_render_errors_total", stage="rasterize", reason=type(e).__name__)
+        return None, {"error": f"pdf_to_{EXTENSIONS[opts.fmt]}_failed", "detail": str(e)}
+    render_cache.put(key, data)
+    return data, {}
+
+
+def _wants_async() -> bool:
+    return (request.args.get("async") or request.form.get("async")) == "1"
+
+
+def _job_links(job_id: str) -> dict:
+    return {
+        "id": job_id,
+        "status_url": url_for("job_status", job_id=job_id),
+        "result_url": url_for("job_result", job_id=job_id),
+    }
+
+
+def _export_artifact(html: str, opts: ImageOptions | None = None, key_html: str | None = None):
+    """
+    Общий путь /export и /export-image: ETag, кэш, рендер, растеризация. opts=None — PDF.
+    key_html — HTML для ключа кэша, если в html есть то, что не должно его менять.
+    """
+    html_with_base = _inject_base(html)
+    if opts is None:
+        fmt, variant = "pdf", ""
+        mimetype, download_name = "application/pdf", "work-hours.pdf"
+    else:
+        fmt, variant = opts.fmt, opts.tag()
+        mimetype, download_name = opts.mimetype, f"work-hours.{opts.extension}"
+    key_source = _inject_base(key_html) if key_html is not None else html_with_base
+    key = render_cache.key(key_source, fmt, variant=variant, renderer=PDF_RENDERER)
+    pdf_key = key if opts is None else render_cache.key(key_source, "pdf", renderer=PDF_RENDERER)
+
+    # ?async=1 — рендер уходит в фоновое задание, воркер сразу свободен
+    if _wants_async():
+        job_id = job_queue.submit(
+            key, partial(_make_artifact, html_with_base, opts, key, pdf_key), mimetype, download_name,
+        )
+        return jsonify(_job_links(job_id)), 202
+
+    # клиент уже держит этот артефакт — даже не рендерим
+    if request.if_none_match.contains(key):
+        resp = make_response("", 304)
+        resp.set_etag(key)
+        return resp
+
+    data, errors = _make_artifact(html_with_base, opts, key, pdf_key)
+    if data is None:
+        return jsonify(errors), 500
 
     return send_file(
-        io.BytesIO(img_bytes),
-        mimetype="image/jpg",
+        io.BytesIO(data),
+        mimetype=mimetype,
         as_attachment=True,
-        download_name="work-hours.jpg",
+        download_name=download_name,
+        etag=key,
     )
+
+
+# ---------- export jobs ----------
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id: str):
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({"error": "unknown_job"}), 404
+    return jsonify({**job, **_job_links(job_id)})
+
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id: str):
+    found = job_queue.result(job_id)
+    if found is None:
+        job = job_queue.status(job_id)
+        if job is None:
+            return jsonify({"error": "unknown_job"}), 404
+        return jsonify({"error": "not_ready", "status": job["status"], "detail": job["error"]}), 409
+
+    data, mimetype, download_name = found
+    return send_file(
+        io.BytesIO(data),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        etag=job_id,
+    )
+
+
+@app.route("/export-image", methods=["POST"])
+def export_image():
+    html = request.form.get("html")
+    if not html:
+        return jsonify({"error": "missing_html"}), 400
+
+    # PDF -> PNG через PyMuPDF (все страницы; раньше отдавался PNG под видом image/jpg)
+    return _export_by_format(html, "png", request.form)
+
 # ---------- export (PDF / JPG) ----------
 @app.route("/export", methods=["POST"])
 def export():
     html = request.form.get("html")
-    fmt  = (request.form.get("format") or "pdf").lower()  # "pdf" | "jpg"
+    fmt  = (request.form.get("format") or "pdf").lower()  # "pdf" | "jpg" | "png"
 
     if not html:
         return jsonify({"error": "missing_html"}), 400
 
-    # чтобы относительные ссылки на CSS/картинки работали
-    base = request.url_root
-    html_with_base = html.replace("<head>", f"<head><base href='{base}'>", 1)
+    return _export_by_format(html, fmt, request.form)
 
-    pdf_bytes = None
-    weasy_err = None
 
-    # 1) Пытаемся через WeasyPrint (если установлены зависимости)
+@app.route("/export/draft", methods=["POST"])
+def export_draft():
+    """Экспорт из черновика (формат wh_draft_v1): result.html рендерится на сервере."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("draft"), dict):
+        return jsonify({"error": "missing_draft"}), 400
+    draft = payload["draft"]
+    fmt = payload.get("format") or "pdf"  # "pdf" | "jpg" | "png"
+    if not isinstance(fmt, str):
+        return jsonify({"error": "bad_format"}), 400
+    fmt = fmt.lower()
+
+    try:
+        first_name, last_name, year, ts = _draft_timesheet(draft)
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"error": "bad_draft", "detail": str(e)}), 400
+    _save_timesheet(first_name, last_name, ts)
+    context = ts.context(first_name, last_name, year)
+
+    # время генерации меняется каждую минуту — в ключ кэша/ETag оно не входит:
+    # ключ считается по HTML с меткой, в отдаваемый документ подставляется время
+    generated_at = context["generated_at"]
+    key_html = render_template("result.html", **{**context, "generated_at": GENERATED_AT_MARK})
+    html = key_html.replace(GENERATED_AT_MARK, generated_at, 1)
+    return _export_by_format(html, fmt, payload, key_html)
+
+
+def _export_by_format(html: str, fmt: str, values, key_html: str | None = None):
+    """fmt: pdf | jpg | png; values — параметры картинки (dpi/scale, quality, gray, max_dim, size, pages)."""
+    if fmt not in ("jpg", "jpeg", "png"):
+        # по умолчанию — PDF
+        return _export_artifact(html, key_html=key_html)
     try:
-        from weasyprint import HTML
-        pdf_bytes = HTML(string=html_with_base).write_pdf()
+        opts = image_options(values, "png" if fmt == "png" else "jpeg", RASTER_DPI)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": "bad_image_options", "detail": str(e)}), 400
+    return _export_artifact(html, opts, key_html)
+
+
+@app.route("/export/cache-stats", methods=["GET"])
+def export_cache_stats():
+    return jsonify(render_cache.stats())
+
+# ---------- batch export (ZIP / merged PDF) ----------
+_batch_executor = None
+
+
+def _batch_workers() -> int:
+    return max(1, int(os.environ.get("BATCH_WORKERS", min(4, os.cpu_count() or 1))))
+
+
+def _get_batch_executor():
+    global _batch_executor
+    if _batch_executor is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = _batch_workers()
+        # spawn: не тащим в детей потоки пула браузеров и состояние воркера gunicorn
+        ctx = multiprocessing.get_context(os.environ.get("BATCH_START_METHOD", "spawn"))
+        _batch_executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+    return _batch_executor
+
+
+def _render_batch_item(draft: dict, fmt: str, url_root: str) -> dict:
+    """Выполняется в процессе пула: draft -> context -> result.html -> PDF/JPG."""
+    try:
+        context = _make_context_from_draft(draft)
     except Exception as e:
-        weasy_err = str(e)
+        return {"summary": None, "error": "bad_draft", "detail": str(e)}
+    try:
+        with app.test_request_context(base_url=url_root):
+            summary = {
+                "name": f"{context['first_name']} {context['last_name']}".strip(),
+                "title": context["title"],
+                "rows": len(context["rows"]),
+                "total_h": context["total_h"],
+                "total_m": int(context["total_m"]),
+                "total_minutes": context["total_h"] * 60 + int(context["total_m"]),
+                "dst": context["dst_note"],
+            }
+            html_with_base = _inject_base(render_template("result.html", **context))
+            pdf_bytes, errors = _render_pdf(html_with_base)
+        if pdf_bytes is None:
+            return {"summary": summary, "error": "render_failed", "detail": errors}
+        data = rasterize(pdf_bytes, ImageOptions(dpi=RASTER_DPI)) if fmt == "jpg" else pdf_bytes
+        return {"summary": summary, "data": data}
+    except Exception as e:
+        return {"summary": None, "error": "render_failed", "detail": str(e)}
+
+
+def _iter_batch_drafts():
+    """(номер, draft | None, ошибка | None) из JSON-массива, NDJSON-тела или NDJSON-файла."""
+    upload = request.files.get("file")
+    if upload is not None:
+        return iter_ndjson(upload.stream)
+    if request.mimetype in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return iter_ndjson(request.stream)
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get("drafts")
+    if not isinstance(payload, list):
+        return None
+    return (
+        (i, d, None) if isinstance(d, dict) else (i, None, "draft_must_be_object")
+        for i, d in enumerate(payload, 1)
+    )
 
-    # 2) Фолбэк: Playwright, если WeasyPrint недоступен
-    if pdf_bytes is None:
-        try:
-            from playwright.sync_api import sync_playwright
-            with sync_playwright() as p:
-                browser = p.chromium.launch()
-                page = browser.new_page()
-                page.set_content(html_with_base, wait_until="load")
-                pdf_bytes = page.pdf(
-                    format="Letter",
-                    print_background=True,
-                    prefer_css_page_size=True,
-                )
-                browser.close()
-        except Exception as e:
-            return jsonify({
-                "error": "render_failed",
-                "weasyprint": weasy_err,
-                "playwright": str(e),
-            }), 500
-
-    # 3) Возвращаем в нужном формате
-    if fmt == "jpg":
+
+@app.route("/export/batch", methods=["POST"])
+def export_batch():
+    fmt    = (request.args.get("format") or "pdf").lower()   # "pdf" | "jpg"
+    bundle = (request.args.get("bundle") or "zip").lower()   # "zip" | "pdf"
+    if fmt not in ("pdf", "jpg") or bundle not in ("zip", "pdf"):
+        return jsonify({"error": "bad_format"}), 400
+    if bundle == "pdf":
+        fmt = "pdf"
+
+    drafts = _iter_batch_drafts()
+    if drafts is None:
+        return jsonify({"error": "missing_drafts"}), 400
+
+    url_root = request.url_root
+    executor = _get_batch_executor()
+    window = _batch_workers() * 2
+    manifest = {"format": fmt, "bundle": bundle, "items": [], "errors": [],
+                "count": 0, "total_minutes": 0}
+
+    def results():
+        order: deque = deque()
+
+        def submit(idx, draft, err):
+            order.append(idx)
+            # невалидные строки не отправляем в пул, но порядок сохраняем
+            if err:
+                return {"error": err}
+            return executor.submit(_render_batch_item, draft, fmt, url_root)
+
+        for res in ordered_map(submit, drafts, window):
+            yield order.popleft(), res
+
+    def collect(idx, res) -> bool:
+        if "data" not in res:
+            manifest["errors"].append({"index": idx, "error": res["error"], "detail": res.get("detail")})
+            return False
+        s = res["summary"]
+        manifest["items"].append({"index": idx, **s})
+        manifest["count"] += 1
+        manifest["total_minutes"] += s["total_minutes"]
+        return True
+
+    def finish_manifest() -> bytes:
+        manifest["total_h"], manifest["total_m"] = divmod(manifest["total_minutes"], 60)
+        return json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+
+    def gen_zip():
+        z = ZipStream()
+        ext = "jpg" if fmt == "jpg" else "pdf"
+        for idx, res in results():
+            if collect(idx, res):
+                s = res["summary"]
+                name = f"{idx:04d}-{safe_name(s['name'])}.{ext}"
+                yield z.add(name, res["data"], compress=(ext == "pdf"))
+        yield z.add("manifest.json", finish_manifest())
+        yield z.close()
+
+    def gen_pdf():
+        merger = PdfMerger(int(os.environ.get("BATCH_MERGE_FLUSH", 25)))
         try:
-            
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            page = doc[0]
-            pix = page.get_pixmap(dpi=200)  # 300 для ещё резче
-            img_bytes = pix.tobytes("jpeg")  # именно JPEG
-        except Exception as e:
-            return jsonify({"error": "pdf_to_jpg_failed", "detail": str(e)}), 500
+            for idx, res in results():
+                if collect(idx, res):
+                    merger.add(res["data"])
+            # без единого документа — страница-заглушка с тем же manifest.json
+            merger.finish(finish_manifest())
+        except BaseException:
+            merger.cleanup()
+            raise
+        yield from merger.iter_file()
+
+    if bundle == "pdf":
+        return Response(stream_with_context(gen_pdf()), mimetype="application/pdf",
+                        headers={"Content-Disposition": "attachment; filename=work-hours-batch.pdf"})
+    return Response(stream_with_context(gen_zip()), mimetype="application/zip",
+                    headers={"Content-Disposition": "attachment; filename=work-hours-batch.zip"})
+
+
+# ---------- timesheet store API ----------
+def _store_required(view):
+    """Маршруты хранилища есть, только если оно включено (TIMESHEET_DB)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if timesheet_store is None:
+            return jsonify({"error": "store_disabled"}), 404
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _range_args() -> tuple[str, str, int | None]:
+    date_from = (request.args.get("from") or "0001-01-01").strip()
+    date_to   = (request.args.get("to") or "9999-12-31").strip()
+    if parse_date(date_from) is None or parse_date(date_to) is None:
+        raise ValueError("from/to must be YYYY-MM-DD")
+    employee_id = request.args.get("employee_id")
+    return date_from, date_to, int(employee_id) if employee_id else None
+
+
+@app.route("/api/employees", methods=["GET"])
+@_store_required
+def api_employees():
+    return jsonify(timesheet_store.employees())
+
+
+@app.route("/api/timesheets", methods=["POST"])
+@_store_required
+def api_save_timesheet():
+    payload = request.get_json(silent=True) or {}
+    draft = payload.get("draft", payload)
+    if not isinstance(draft, dict):
+        return jsonify({"error": "missing_draft"}), 400
+    try:
+        first_name, last_name, _, ts = _draft_timesheet(draft)
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"error": "bad_draft", "detail": str(e)}), 400
+    if not (first_name or last_name):
+        return jsonify({"error": "missing_name"}), 400
+    return jsonify(timesheet_store.save_timesheet(first_name, last_name, ts))
+
+
+@app.route("/api/shifts/<int:shift_id>", methods=["PUT", "PATCH", "DELETE"])
+@_store_required
+def api_shift(shift_id: int):
+    if request.method == "DELETE":
+        if not timesheet_store.delete_shift(shift_id):
+            return jsonify({"error": "unknown_shift"}), 404
+        return jsonify({"deleted": shift_id})
+
+    row = request.get_json(silent=True)
+    if not isinstance(row, dict):
+        return jsonify({"error": "missing_shift"}), 400
+    try:
+        shift = timesheet_store.edit_shift(shift_id, row)
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({"error": "bad_shift", "detail": str(e)}), 400
+    if shift is None:
+        return jsonify({"error": "unknown_shift"}), 404
+    return jsonify(shift)
 
-        return send_file(
-            io.BytesIO(img_bytes),
-            mimetype="image/jpeg",
-            as_attachment=True,
-            download_name="work-hours.jpg",
-        )
 
-    # по умолчанию — PDF
-    return send_file(
-        io.BytesIO(pdf_bytes),
-        mimetype="application/pdf",
-        as_attachment=True,
-        download_name="work-hours.pdf",
-    )
+@app.route("/api/totals", methods=["GET"])
+@_store_required
+def api_totals():
+    try:
+        date_from, date_to, employee_id = _range_args()
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 400
+    return jsonify(timesheet_store.range_totals(date_from, date_to, employee_id))
+
+
+@app.route("/api/periods", methods=["GET"])
+@_store_required
+def api_periods():
+    try:
+        date_from, date_to, employee_id = _range_args()
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 400
+    return jsonify(timesheet_store.period_totals(date_from, date_to, employee_id))
+
+
+@app.route("/api/overtime", methods=["GET"])
+@_store_required
+def api_overtime():
+    try:
+        date_from, date_to, employee_id = _range_args()
+        weekly_hours = float(request.args.get("weekly_hours") or 40)
+        if not 0 <= weekly_hours <= 7 * 24:
+            raise ValueError("weekly_hours must be between 0 and 168")
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 400
+    return jsonify(timesheet_store.overtime(date_from, date_to, round(weekly_hours * 60), employee_id))
+
+
+@app.route("/api/dst-shifts", methods=["GET"])
+@_store_required
+def api_dst_shifts():
+    try:
+        date_from, date_to, employee_id = _range_args()
+        # LIMIT -1 в SQLite — «без ограничения», поэтому снизу тоже зажимаем
+        limit = max(1, min(int(request.args.get("limit") or 1000), 10000))
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 400
+    return jsonify(timesheet_store.dst_shifts(date_from, date_to, employee_id, limit))
+
+
+# ---------- live totals ----------
+@app.route("/api/live", methods=["POST"])
+def api_live():
+    """Живые итоги формы: дифф строк по id -> изменённые строки + новые итоги."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get("changes", []), list):
+        return jsonify({"error": "bad_payload"}), 400
+    try:
+        result = live_totals.apply(payload.get("session"), payload.get("tz"), payload.get("changes", []))
+    except ValueError as e:
+        return jsonify({"error": "bad_changes", "detail": str(e)}), 400
+    return jsonify(result)
+
+
+@app.route("/api/live/<session_id>", methods=["DELETE"])
+def api_live_drop(session_id: str):
+    live_totals.drop(session_id)
+    return jsonify({"deleted": session_id})
+
+
+# ---------- import ----------
+IMPORT_MAX_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", 100))
+ICS_MIMETYPES = ("text/calendar", "application/ics")
+
+
+def _import_source():
+    """(вид, байтовый поток): файл из multipart или сырое тело; вид — по ?kind, расширению или типу."""
+    upload = request.files.get("file")
+    if upload is not None:
+        raw, filename, mimetype = upload.stream, upload.filename or "", upload.mimetype
+    else:
+        raw, filename, mimetype = request.stream, "", request.mimetype
+    kind = (request.values.get("kind") or "").lower()
+    if not kind:
+        is_ics = filename.lower().endswith(".ics") or mimetype in ICS_MIMETYPES
+        kind = "ics" if is_ics else "csv"
+    return kind, raw
+
+
+@app.route("/import", methods=["POST"])
+def import_shifts():
+    """
+    CSV/ICS -> смены. Файл читается построчно, в памяти только сами смены
+    и первые IMPORT_MAX_ERRORS ошибок. ?format=html — сразу готовый отчёт как
+    из /build, иначе JSON с черновиком wh_draft_v1.
+    """
+    kind, raw = _import_source()
+    if kind not in ("csv", "ics"):
+        return jsonify({"error": "bad_kind", "detail": "kind must be csv or ics"}), 400
+
+    values = request.values
+    last_name  = (values.get("last_name") or "").strip()
+    first_name = (values.get("first_name") or "").strip()
+    try:
+        year = int(values.get("year") or 0)
+    except ValueError:
+        return jsonify({"error": "bad_year"}), 400
+    ts = Timesheet(values.get("tz"))
+
+    errors, error_count = [], 0
+    with stage("import_parse"):
+        lines = text_stream(raw)
+        items = iter_ics(lines, ts.tz) if kind == "ics" else iter_csv(lines)
+        add = ts.add
+        for lineno, shift, err in items:
+            if shift is not None:
+                add(*shift)
+                continue
+            error_count += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append({"line": lineno, "error": err})
+
+    if (values.get("format") or "draft").lower() == "html":
+        with stage("build_compute"):
+            context = ts.context(first_name, last_name, year or (ts.shifts[0].day.year if ts.shifts else 0))
+        with stage("store"):
+            _save_timesheet(first_name, last_name, ts)
+        with stage("build_template"):
+            resp = make_response(render_template("result.html", **context))
+        resp.headers["X-Import-Errors"] = str(error_count)
+        return resp
+
+    return jsonify({
+        "draft": {
+            "last_name": last_name,
+            "first_name": first_name,
+            "year": str(year or ""),
+            "tz": ts.tz_name,
+            "rows": [
+                {"date": sh.day.isoformat(), "start": f"{sh.sh:02d}:{sh.sm:02d}", "end": f"{sh.eh:02d}:{sh.em:02d}"}
+                for sh in ts.shifts
+            ],
+        },
+        "imported": len(ts.shifts),
+        "skipped": error_count,
+        "errors": errors,
+        "errors_truncated": error_count > len(errors),
+        **ts.totals(),
+    })
+
 
 # ---------- form ----------
 @app.route("/", methods=["GET"])
@@ -285,83 +680,17 @@ def build():
     first_name = request.form.get("first_name", "").strip()
     year       = int(request.form.get("year", "0") or 0)
 
-    # ❶ тайм-зона из формы + безопасный фолбэк
-    tz_name = (request.form.get("tz") or "").strip() or os.environ.get("DEFAULT_TZ", "America/Chicago")
-    try:
-        tz = ZoneInfo(tz_name)
-    except ZoneInfoNotFoundError:
-        tz = ZoneInfo("America/Chicago")  # последний фолбэк
-
+    # тайм-зона из формы (фолбэк — внутри движка), строки считаем одним проходом
     dates  = request.form.getlist("date[]")
     ranges = request.form.getlist("range[]")
-
-    rows = []
-    total_minutes = 0
-
-    for d_str, r_str in zip(dates, ranges):
-        d_str = (d_str or "").strip()
-        r_str = (r_str or "").strip()
-        if not d_str or not r_str:
-            continue
-
-        if not re.match(r"^\d{4}-\d{2}-\d{2}$", d_str):
-            continue
-        try:
-            base_date = datetime.strptime(d_str, "%Y-%m-%d")
-        except ValueError:
-            continue
-
-        # ❷ ТУТ передаём tz в parse_range
-        try:
-            start, end, hh, mm, dst_adjusted = parse_range(base_date, r_str, tz)
-        except ValueError:
-            continue
-
-        total_minutes += hh * 60 + mm
-        rows.append({
-            "date": base_date.strftime("%m/%d/%Y"),
-            "day":  day_name(base_date),
-            "time_label": f"{start.strftime('%I:%M %p').lstrip('0').lower()} – {end.strftime('%I:%M %p').lstrip('0').lower()}",
-            "h": hh,
-            "m": f"{mm:02d}",
-            "dst": dst_adjusted,
-        })
-
-    rows.sort(key=lambda r: datetime.strptime(r["date"], "%m/%d/%Y"))
-
-    dates_for_title = [datetime.strptime(r["date"], "%m/%d/%Y").date() for r in rows]
-    if dates_for_title:
-        period_title = make_period_title(dates_for_title)
-        title_str = f"{first_name} {last_name} — Work Hours ({period_title})"
-    else:
-        title_str = f"{first_name} {last_name} — Work Hours ({year})"
-
-    subtotal_h = sum(r["h"] for r in rows)
-    subtotal_m = sum(int(r["m"]) for r in rows)
-    m_to_h, m_rem = divmod(subtotal_m, 60)
-    total_h = subtotal_h + m_to_h
-    total_m = m_rem
-
-    dst_note = any(r["dst"] for r in rows)
-
-    context = {
-        "title": title_str,
-        "last_name": last_name,
-        "first_name": first_name,
-        "year": year,
-        "rows": rows,
-        "subtotal_h": subtotal_h,
-        "subtotal_m": subtotal_m,
-        "subtotal_m_as_h": m_to_h,
-        "subtotal_m_rem": m_rem,
-        "total_h": total_h,
-        "total_m": f"{total_m:02d}",
-        "dst_note": dst_note,
-        "tz_name": tz_name,              # ← полезно показать в отчёте
-        "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-    }
-
-    return render_template("result.html", **context)
+    with stage("build_compute"):
+        ts = Timesheet.from_ranges(request.form.get("tz"), zip(dates, ranges))
+        context = ts.context(first_name, last_name, year)
+    with stage("store"):
+        _save_timesheet(first_name, last_name, ts)
+
+    with stage("build_template"):
+        return render_template("result.html", **context)
 
 
 
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import zlib
+
+from flask import Flask, Response, request
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.wsgi import LimitedStream
+
+try:  # brotli необязателен: без него отдаём только gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _compressible(mimetype: str | None) -> bool:
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE)
+
+
+def compress(data: bytes, encoding: str, fast: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=5 if fast else 11)
+    return gzip.compress(data, compresslevel=6 if fast else 9, mtime=0)
+
+
+def negotiate(accept_encoding) -> str | None:
+    """Лучшая кодировка из Accept-Encoding: br, затем gzip."""
+    if brotli is not None and accept_encoding["br"]:
+        return "br"
+    if accept_encoding["gzip"]:
+        return "gzip"
+    return None
+
+
+class _Asset:
+    __slots__ = ("path", "hashed", "etag", "mimetype", "data", "variants")
+
+    def __init__(self, path: str, hashed: str, etag: str, mimetype: str, data: bytes):
+        self.path, self.hashed, self.etag, self.mimetype, self.data = path, hashed, etag, mimetype, data
+        self.variants: dict[str, bytes] = {}
+
+
+class StaticAssets:
+    """
+    Фингерпринт static/ при старте: style.css -> style.3f2a9c1d0b7e.css.
+
+    url_for('static', filename='style.css') сам подставляет имя с хэшем
+    (url_defaults), так что шаблоны не меняются и ?v=N больше не нужен.
+    Файлы с хэшем отдаются как immutable, текстовые — заранее сжатыми
+    gzip/brotli вариантами; старые имена без хэша — с проверкой по ETag.
+    """
+
+    def __init__(self, static_dir: str, min_compress: int = 512):
+        self.static_dir = static_dir
+        self.min_compress = min_compress
+        self._by_name: dict[str, _Asset] = {}
+        self._by_hashed: dict[str, _Asset] = {}
+
+    @classmethod
+    def from_env(cls, static_dir: str) -> "StaticAssets":
+        assets = cls(static_dir, int(os.environ.get("STATIC_COMPRESS_MIN", 512)))
+        assets.scan()
+        return assets
+
+    def scan(self) -> None:
+        by_name, by_hashed = {}, {}
+        for root, _, files in os.walk(self.static_dir):
+            for fname in files:
+                full = os.path.join(root, fname)
+                name = os.path.relpath(full, self.static_dir).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                stem, ext = os.path.splitext(name)
+                mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                asset = _Asset(full, f"{stem}.{digest}{ext}", digest, mimetype, data)
+                if _compressible(mimetype) and len(data) >= self.min_compress:
+                    asset.variants["gzip"] = compress(data, "gzip")
+                    if brotli is not None:
+                        asset.variants["br"] = compress(data, "br")
+                by_name[name] = asset
+                by_hashed[asset.hashed] = asset
+        self._by_name, self._by_hashed = by_name, by_hashed
+
+    def hashed(self, filename: str) -> str:
+        asset = self._by_name.get(filename)
+        return asset.hashed if asset else filename
+
+    def logical(self, filename: str) -> str:
+        """Обратное отображение: имя с хэшем -> путь внутри static/."""
+        asset = self._by_hashed.get(filename)
+        return os.path.relpath(asset.path, self.static_dir).replace(os.sep, "/") if asset else filename
+
+    def serve(self, filename: str):
+        asset = self._by_hashed.get(filename)
+        immutable = asset is not None
+        if asset is None:
+            asset = self._by_name.get(filename)
+        if asset is None:
+            from flask import current_app
+
+            return current_app.send_static_file(filename)
+
+        encoding = negotiate(request.accept_encodings) if asset.variants else None
+        body = asset.variants.get(encoding, asset.data) if encoding else asset.data
+        resp = Response(body, mimetype=asset.mimetype)
+        if encoding in asset.variants:
+            resp.headers["Content-Encoding"] = encoding
+        if asset.variants:
+            resp.vary.add("Accept-Encoding")
+        resp.set_etag(asset.etag)
+        if immutable:
+            resp.headers["Cache-Control"] = IMMUTABLE
+        else:
+            resp.cache_control.no_cache = True
+        return resp.make_conditional(request)
+
+    def install(self, app: Flask) -> None:
+        app.view_functions["static"] = self.serve
+
+        @app.url_defaults
+        def _static_fingerprint(endpoint, values):
+            if endpoint == "static" and "filename" in values:
+                values["filename"] = self.hashed(values["filename"])
+
+
+# ---------- ответы ----------
+def install_compression(app: Flask, min_size: int = 1024) -> None:
+    """gzip/brotli для текстовых ответов (/build, JSON) по Accept-Encoding."""
+
+    @app.after_request
+    def _compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or not 200 <= response.status_code < 300
+            or not _compressible(response.mimetype)
+        ):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = negotiate(request.accept_encodings)
+        data = response.get_data()
+        if encoding is None or len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding, fast=True))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+# ---------- запросы ----------
+class _InflateStream(io.RawIOBase):
+    """
+    Распаковка тела запроса на лету; мусор вместо gzip — 400, а не 500.
+    Распакованное сверх max_bytes — 413: LimitedStream werkzeug на лимите
+    просто обрывает чтение, и форма разобралась бы из обрезка.
+    """
+
+    def __init__(self, raw, max_bytes: int | None = None, chunk: int = 64 << 10):
+        self._raw = raw
+        self._max_bytes = max_bytes
+        self._total = 0
+        self._chunk = chunk
+        self._z = zlib.decompressobj(wbits=47)  # gzip или zlib по заголовку
+        self._buf = b""
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self) -> None:
+        # выход за chunk за раз невозможен: «бомба» не раздувает память
+        src = self._z.unconsumed_tail or self._raw.read(self._chunk)
+        try:
+            if src and not self._z.eof:
+                self._buf = self._z.decompress(src, self._chunk)
+            else:
+                self._buf, self._eof = self._z.flush(), True
+        except zlib.error as e:
+            raise BadRequest(f"invalid compressed body: {e}")
+        self._total += len(self._buf)
+        if self._max_bytes is not None and self._total > self._max_bytes:
+            raise RequestEntityTooLarge()
+
+    def readinto(self, b) -> int:
+        while not self._buf and not self._eof:
+            self._fill()
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+class DecompressMiddleware:
+    """
+    WSGI-обёртка: тело запроса с Content-Encoding: gzip|deflate.
+
+    Сжатое тело сверх MAX_CONTENT_LENGTH отклоняется сразу по Content-Length,
+    распакованное — как только при чтении перевалит за тот же лимит (413).
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in ("gzip", "x-gzip", "deflate"):
+            max_bytes = self.app.config.get("MAX_CONTENT_LENGTH")
+            raw = environ["wsgi.input"]
+            length = environ.pop("CONTENT_LENGTH", "")
+            if length.isdigit():
+                if max_bytes is not None and int(length) > max_bytes:
+                    return RequestEntityTooLarge()(environ, start_response)
+                raw = LimitedStream(raw, int(length))
+            del environ["HTTP_CONTENT_ENCODING"]
+            environ["wsgi.input"] = io.BufferedReader(_InflateStream(raw, max_bytes))
+            environ["wsgi.input_terminated"] = True
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Iterable, Iterator
+
+
+def iter_ndjson(lines: Iterable[bytes | str]) -> Iterator[tuple[int, dict | None, str | None]]:
+    """(номер строки, draft | None, ошибка | None) — по одной строке, без чтения всего тела."""
+    for lineno, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", "replace")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            yield lineno, None, f"invalid_json: {e}"
+            continue
+        if not isinstance(obj, dict):
+            yield lineno, None, "draft_must_be_object"
+            continue
+        yield lineno, obj, None
+
+
+def ordered_map(submit: Callable, items: Iterable, window: int) -> Iterator:
+    """
+    Как executor.map, но не больше window заданий в полёте — память не растёт
+    с размером пачки. submit может вернуть Future или сразу готовый результат.
+    """
+    pending: deque = deque()
+    for args in items:
+        pending.append(submit(*args))
+        if len(pending) >= window:
+            yield _result(pending.popleft())
+    while pending:
+        yield _result(pending.popleft())
+
+
+def _result(x):
+    return x.result() if isinstance(x, Future) else x
+
+
+def safe_name(*parts: str) -> str:
+    name = "-".join(p for p in parts if p)
+    return re.sub(r"[^\w.-]+", "_", name, flags=re.UNICODE).strip("_") or "timesheet"
+
+
+class _Sink:
+    """Несикабельный приёмник для ZipFile: всё записанное отдаём кусками."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+class ZipStream:
+    """ZIP, который отдаётся клиенту по мере добавления файлов."""
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zf = zipfile.ZipFile(self._sink, mode="w")
+
+    def add(self, name: str, data: bytes, compress: bool = True) -> bytes:
+        method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self._zf.writestr(name, data, compress_type=method)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._zf.close()
+        return self._sink.drain()
+
+
+class PdfMerger:
+    """
+    Склейка PDF через PyMuPDF во временный файл.
+
+    Каждые flush_every документов делаем saveIncr и переоткрываем файл, чтобы
+    уже вставленные страницы не копились в памяти.
+    """
+
+    def __init__(self, flush_every: int = 25):
+        import fitz
+
+        self._fitz = fitz
+        self.flush_every = max(1, flush_every)
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        self._doc = None
+        self._since_flush = 0
+
+    def add(self, pdf_bytes: bytes) -> None:
+        fitz = self._fitz
+        src = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            if self._doc is None:
+                src.save(self.path)
+                self._doc = fitz.open(self.path)
+                return
+            self._doc.insert_pdf(src)
+        finally:
+            src.close()
+        self._since_flush += 1
+        if self._since_flush >= self.flush_every:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._doc.saveIncr()
+        self._doc.close()
+        self._doc = self._fitz.open(self.path)
+        self._since_flush = 0
+
+    def finish(self, manifest: bytes | None = None) -> bool:
+        """
+        Дописать manifest и закрыть файл. False, если не было ни одного
+        документа: тогда в файле одна страница-заглушка, но PDF всё равно валидный.
+        """
+        added = self._doc is not None
+        if not added:
+            self._doc = self._fitz.open()
+            page = self._doc.new_page()
+            page.insert_text((72, 72), "No timesheets were rendered; see manifest.json", fontsize=12)
+        if manifest is not None:
+            self._doc.embfile_add("manifest.json", manifest, filename="manifest.json")
+        if added:
+            self._doc.saveIncr()
+        else:
+            self._doc.save(self.path)
+        self._doc.close()
+        self._doc = None
+        return added
+
+    def iter_file(self, chunk_size: int = 64 << 10) -> Iterator[bytes]:
+        try:
+            with open(self.path, "rb") as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+        finally:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
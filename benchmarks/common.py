@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import random
+import resource
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from typing import Callable
+
+ROW_COUNTS = (10, 100, 1000, 10000)
+
+
+def synthetic_draft(rows: int, seed: int = 42, tz: str = "America/Chicago") -> dict:
+    """Черновик wh_draft_v1 на rows смен, год подряд с захватом переводов часов."""
+    rnd = random.Random(seed)
+    start = date(2025, 1, 1)
+    out = []
+    for i in range(rows):
+        d = start + timedelta(days=i % 365)
+        sh = rnd.randint(0, 23)
+        out.append({
+            "date": d.isoformat(),
+            "start": f"{sh:02d}:{rnd.choice((0, 15, 30, 45)):02d}",
+            "end": f"{(sh + rnd.randint(4, 12)) % 24:02d}:{rnd.choice((0, 10, 20, 50)):02d}",
+        })
+    return {"last_name": "Doe", "first_name": "Jane", "year": "2025", "tz": tz, "rows": out}
+
+
+def _ampm(hhmm: str) -> str:
+    h, m = map(int, hhmm.split(":"))
+    return f"{(h + 11) % 12 + 1}:{m:02d} {'pm' if h >= 12 else 'am'}"
+
+
+def draft_to_form(draft: dict) -> dict:
+    """То же, что отправляет index.html: date[] + range[]."""
+    return {
+        "last_name": draft["last_name"],
+        "first_name": draft["first_name"],
+        "year": draft["year"],
+        "tz": draft["tz"],
+        "date[]": [r["date"] for r in draft["rows"]],
+        "range[]": [f"{_ampm(r['start'])} - {_ampm(r['end'])}" for r in draft["rows"]],
+    }
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS отдаёт байты, Linux — килобайты
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def summarize(latencies: list[float], wall: float, errors: int = 0) -> dict:
+    lat = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)  # noqa: E731
+    return {
+        "n": len(lat),
+        "errors": errors,
+        "mean_ms": ms(statistics.fmean(lat)) if lat else 0.0,
+        "p50_ms": ms(percentile(lat, 50)),
+        "p90_ms": ms(percentile(lat, 90)),
+        "p99_ms": ms(percentile(lat, 99)),
+        "max_ms": ms(lat[-1]) if lat else 0.0,
+        "throughput_rps": round(len(lat) / wall, 2) if wall > 0 else 0.0,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def time_calls(fn: Callable[[], object], repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - t0)
+
+
+def repeat_for(rows: int, budget: int = 20000) -> int:
+    """Чем больше строк, тем меньше повторов: держим суммарную работу примерно постоянной."""
+    return max(3, min(200, budget // max(rows, 1)))
@@ -0,0 +1,43 @@
+"""Сравнение двух bench_results.json: python -m benchmarks.compare base.json head.json"""
+from __future__ import annotations
+
+import json
+import sys
+
+METRICS = ("p50_ms", "p99_ms", "throughput_rps", "peak_rss_kb")
+
+
+def _load(path: str) -> tuple[dict, dict]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    index = {(r["suite"], r["case"], r["rows"], r["concurrency"]): r for r in data["results"]}
+    return data.get("meta", {}), index
+
+
+def _delta(old: float, new: float) -> str:
+    if not old:
+        return "    n/a"
+    return f"{(new - old) / old * 100:+7.1f}%"
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__)
+        return 2
+    (meta_a, a), (meta_b, b) = _load(argv[0]), _load(argv[1])
+    print(f"base {meta_a.get('commit')}  ->  head {meta_b.get('commit')}")
+    print(f"{'case':32} " + " ".join(f"{m:>22}" for m in METRICS))
+    for key in sorted(a.keys() & b.keys()):
+        ra, rb = a[key], b[key]
+        if "p50_ms" not in ra or "p50_ms" not in rb:
+            continue
+        suite, case, rows, conc = key
+        # значение в head и изменение относительно base
+        cells = [f"{rb[m]:.2f} {_delta(ra[m], rb[m])}" for m in METRICS]
+        print(f"{suite}/{case} r={rows} c={conc}".ljust(32) + " " + " ".join(f"{c:>22}" for c in cells))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
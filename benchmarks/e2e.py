@@ -0,0 +1,99 @@
+"""Сквозные бенчмарки через Flask test client с заданной конкурентностью."""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import draft_to_form, summarize, synthetic_draft
+
+
+def _drive(make_request, concurrency: int, requests: int) -> dict:
+    from app import app
+
+    local = threading.local()
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        t = time.perf_counter()
+        resp = make_request(client)
+        dt = time.perf_counter() - t
+        with lock:
+            latencies.append(dt)
+            if resp.status_code >= 400:
+                errors += 1
+
+    make_request(app.test_client())  # прогрев: шаблоны, импорты, пулы
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        list(ex.map(one, range(requests)))
+    return summarize(latencies, time.perf_counter() - t0, errors)
+
+
+def _result_html(rows: int) -> str:
+    from app import _make_context_from_draft, app
+    from flask import render_template
+
+    with app.test_request_context():
+        return render_template("result.html", **_make_context_from_draft(synthetic_draft(rows)))
+
+
+def bench_build(rows: int, concurrency: int, requests: int) -> dict:
+    form = draft_to_form(synthetic_draft(rows))
+    return _drive(lambda c: c.post("/build", data=form), concurrency, requests)
+
+
+def bench_export_pdf(rows: int, concurrency: int, requests: int) -> dict:
+    html = _result_html(rows)
+    return _drive(lambda c: c.post("/export", data={"html": html, "format": "pdf"}), concurrency, requests)
+
+
+def bench_export_jpg(rows: int, concurrency: int, requests: int) -> dict:
+    html = _result_html(rows)
+    return _drive(lambda c: c.post("/export", data={"html": html, "format": "jpg"}), concurrency, requests)
+
+
+def bench_export_image(rows: int, concurrency: int, requests: int) -> dict:
+    html = _result_html(rows)
+    return _drive(lambda c: c.post("/export-image", data={"html": html}), concurrency, requests)
+
+
+def bench_import_csv(rows: int, concurrency: int, requests: int) -> dict:
+    draft = synthetic_draft(rows)
+    body = "date,start,end\n" + "".join(f"{r['date']},{r['start']},{r['end']}\n" for r in draft["rows"])
+    return _drive(
+        lambda c: c.post(f"/import?tz={draft['tz']}", data=body, content_type="text/csv"),
+        concurrency, requests,
+    )
+
+
+def bench_live(rows: int, concurrency: int, requests: int) -> dict:
+    """Одна правка строки поверх сессии на rows строк — сравнивать с build на тех же rows."""
+    from app import app
+
+    draft = synthetic_draft(rows)
+    changes = [{"op": "set", "id": str(i), **r} for i, r in enumerate(draft["rows"])]
+    session = app.test_client().post("/api/live", json={"tz": draft["tz"], "changes": changes[:500]}).get_json()
+    for i in range(500, len(changes), 500):
+        session = app.test_client().post(
+            "/api/live", json={"session": session["session"], "tz": draft["tz"], "changes": changes[i:i + 500]},
+        ).get_json()
+    edit = {"op": "edit", "id": "0", "date": draft["rows"][0]["date"], "start": "09:00", "end": "17:30"}
+    body = {"session": session["session"], "tz": draft["tz"], "changes": [edit]}
+    return _drive(lambda c: c.post("/api/live", json=body), concurrency, requests)
+
+
+CASES = {
+    "build": bench_build,
+    "export_pdf": bench_export_pdf,
+    "export_jpg": bench_export_jpg,
+    "export_image": bench_export_image,
+    "import_csv": bench_import_csv,
+    "live": bench_live,
+}
@@ -0,0 +1,113 @@
+"""Микробенчмарки: разбор строк, итоги, шаблон, рендер WeasyPrint (app.weasy_renderer) и растеризация PyMuPDF."""
+from __future__ import annotations
+
+from datetime import datetime
+
+from benchmarks.common import draft_to_form, repeat_for, synthetic_draft, time_calls
+
+
+def _skipped(reason: str) -> dict:
+    return {"skipped": reason}
+
+
+def bench_parse_range(rows: int, concurrency: int) -> dict:
+    from timesheet import parse_range, resolve_tz
+
+    form = draft_to_form(synthetic_draft(rows))
+    _, tz = resolve_tz(form["tz"])
+    pairs = [(datetime.strptime(d, "%Y-%m-%d"), r) for d, r in zip(form["date[]"], form["range[]"])]
+
+    def run():
+        for d, r in pairs:
+            parse_range(d, r, tz)
+
+    return time_calls(run, repeat_for(rows))
+
+
+def bench_engine(rows: int, concurrency: int) -> dict:
+    from timesheet import Timesheet
+
+    form = draft_to_form(synthetic_draft(rows))
+    pairs = list(zip(form["date[]"], form["range[]"]))
+
+    def run():
+        Timesheet.from_ranges(form["tz"], pairs).context("Jane", "Doe", 2025)
+
+    return time_calls(run, repeat_for(rows))
+
+
+def bench_make_context(rows: int, concurrency: int) -> dict:
+    from app import _make_context_from_draft
+
+    draft = synthetic_draft(rows)
+    return time_calls(lambda: _make_context_from_draft(draft), repeat_for(rows))
+
+
+def bench_template(rows: int, concurrency: int) -> dict:
+    from flask import render_template
+
+    from app import _make_context_from_draft, app
+
+    context = _make_context_from_draft(synthetic_draft(rows))
+    with app.test_request_context():
+        return time_calls(lambda: render_template("result.html", **context), repeat_for(rows, 5000))
+
+
+def _result_html(rows: int) -> str:
+    from flask import render_template
+
+    from app import _inject_base, _make_context_from_draft, app
+
+    with app.test_request_context(base_url="http://localhost/"):
+        return _inject_base(render_template("result.html", **_make_context_from_draft(synthetic_draft(rows))))
+
+
+def bench_weasyprint(rows: int, concurrency: int) -> dict:
+    # тот же путь, что у /export: style.css из кэша байтов (WeasyPrint разбирает его на каждом рендере),
+    # общий FontConfiguration, /static с диска
+    from app import weasy_renderer
+
+    try:
+        weasy_renderer.load()
+    except Exception as e:  # нет pango/cairo и т.п.
+        return _skipped(f"weasyprint unavailable: {e}")
+    html = _result_html(rows)
+    return time_calls(lambda: weasy_renderer.render_pdf(html), repeat_for(rows, 200), warmup=1)
+
+
+def _sample_pdf(rows: int) -> tuple[bytes, str]:
+    """PDF отчёта через WeasyPrint, а без него — синтетический PDF с тем же числом страниц."""
+    from app import weasy_renderer
+
+    try:
+        return weasy_renderer.render_pdf(_result_html(rows)), "weasyprint"
+    except Exception:
+        import fitz
+
+        doc = fitz.open()
+        for p in range(max(1, rows // 40)):
+            page = doc.new_page(width=612, height=792)
+            for line in range(40):
+                page.insert_text((40, 40 + line * 18), f"row {p * 40 + line}  09:00 am – 5:30 pm  8  30")
+        return doc.tobytes(), "synthetic"
+
+
+def bench_rasterize(rows: int, concurrency: int) -> dict:
+    from imaging import ImageOptions, rasterize
+
+    if rows > 1000:
+        return _skipped("rasterize is capped at 1000 rows (25 pages)")
+    pdf_bytes, source = _sample_pdf(rows)
+    opts = ImageOptions(dpi=200)
+    result = time_calls(lambda: rasterize(pdf_bytes, opts), repeat_for(rows, 200))
+    return {**result, "pdf_source": source}
+
+
+CASES = {
+    "parse_range": bench_parse_range,
+    "engine": bench_engine,
+    "make_context": bench_make_context,
+    "template": bench_template,
+    "weasyprint": bench_weasyprint,
+    "rasterize": bench_rasterize,
+}
@@ -0,0 +1,123 @@
+"""
+Бенчмарки горячих путей: разбор/итоги, шаблон, рендер и экспорт.
+
+    python -m benchmarks.run                       # всё, результат в bench_results.json
+    python -m benchmarks.run --suite micro --rows 10,1000
+    python -m benchmarks.run --suite e2e --concurrency 1,8 --requests 40
+    python -m benchmarks.compare old.json new.json
+
+Каждый случай идёт в отдельном процессе, поэтому peak_rss_kb — пик именно этого случая.
+Кэш рендера на время замеров выключен, хранилище и задания пишут во временный каталог.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.common import ROW_COUNTS
+
+SUITES = ("micro", "e2e")
+E2E_ROWS = (10, 100, 1000)
+CONCURRENCY = (1, 4, 8)
+
+
+def _isolate_env(tmpdir: str) -> None:
+    # замеряем работу, а не попадания в кэш и не чужую базу
+    os.environ["RENDER_CACHE_ITEMS"] = "0"
+    os.environ.pop("RENDER_CACHE_DIR", None)
+    os.environ["TIMESHEET_DB"] = os.path.join(tmpdir, "timesheets.sqlite3")
+    os.environ["JOBS_DB"] = os.path.join(tmpdir, "jobs.sqlite3")
+    os.environ["LIVE_DB"] = os.path.join(tmpdir, "live.sqlite3")
+
+
+def _run_case(suite: str, name: str, rows: int, concurrency: int, requests: int, tmpdir: str) -> dict:
+    _isolate_env(tmpdir)
+    if suite == "micro":
+        from benchmarks.micro import CASES
+        result = CASES[name](rows, concurrency)
+    else:
+        from benchmarks.e2e import CASES
+        result = CASES[name](rows, concurrency, requests)
+    return {"suite": suite, "case": name, "rows": rows, "concurrency": concurrency, **result}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _ints(value: str) -> tuple[int, ...]:
+    return tuple(int(v) for v in value.split(",") if v.strip())
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--suite", choices=(*SUITES, "all"), default="all")
+    p.add_argument("--case", action="append", help="только эти случаи (можно несколько раз)")
+    p.add_argument("--rows", type=_ints, help=f"строк в табеле (micro: {ROW_COUNTS}, e2e: {E2E_ROWS})")
+    p.add_argument("--concurrency", type=_ints, default=CONCURRENCY, help="потоков-клиентов для e2e")
+    p.add_argument("--requests", type=int, default=40, help="запросов на один e2e-замер")
+    p.add_argument("--out", default="bench_results.json")
+    args = p.parse_args(argv)
+
+    from benchmarks import e2e, micro
+
+    plan = []
+    for suite in SUITES if args.suite == "all" else (args.suite,):
+        cases = micro.CASES if suite == "micro" else e2e.CASES
+        rows_list = args.rows or (ROW_COUNTS if suite == "micro" else E2E_ROWS)
+        conc_list = (1,) if suite == "micro" else args.concurrency
+        for name in cases:
+            if args.case and name not in args.case:
+                continue
+            plan += [(suite, name, r, c) for r in rows_list for c in conc_list]
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for suite, name, rows, conc in plan:
+            with ProcessPoolExecutor(1, mp_context=ctx) as ex:
+                try:
+                    res = ex.submit(_run_case, suite, name, rows, conc, args.requests, tmpdir).result()
+                except Exception as e:
+                    res = {"suite": suite, "case": name, "rows": rows, "concurrency": conc, "failed": str(e)}
+            results.append(res)
+            if "p50_ms" in res:
+                line = f"p50 {res['p50_ms']:>10.3f} ms  p99 {res['p99_ms']:>10.3f} ms  " \
+                       f"{res['throughput_rps']:>9.2f}/s  rss {res['peak_rss_kb'] // 1024} MB"
+                if res.get("errors"):
+                    line += f"  errors {res['errors']}/{res['n']}"
+            else:
+                line = res.get("skipped") or f"FAILED: {res.get('failed')}"
+            print(f"{suite:5} {name:13} rows={rows:<6} c={conc:<3} {line}", flush=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
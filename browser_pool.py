@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+class PoolTimeout(RuntimeError):
+    """Все страницы заняты дольше acquire_timeout."""
+
+
+class BrowserPool:
+    """
+    Пул заранее запущенных Chromium (Playwright) на время жизни воркера.
+
+    Sync API Playwright привязан к потоку, который его создал, поэтому каждый
+    слот — отдельный поток со своим браузером и страницей; запросы передаются
+    слотам через общую очередь.
+    """
+
+    def __init__(self, size: int = 2, max_renders: int = 100,
+                 acquire_timeout: float = 30.0, render_timeout: float = 60.0):
+        self.size = max(1, size)
+        self.max_renders = max(1, max_renders)
+        self.acquire_timeout = acquire_timeout
+        self.render_timeout = render_timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    @classmethod
+    def from_env(cls) -> "BrowserPool":
+        return cls(
+            size=int(os.environ.get("BROWSER_POOL_SIZE", 2)),
+            max_renders=int(os.environ.get("BROWSER_MAX_RENDERS", 100)),
+            acquire_timeout=float(os.environ.get("BROWSER_ACQUIRE_TIMEOUT", 30)),
+            render_timeout=float(os.environ.get("BROWSER_RENDER_TIMEOUT", 60)),
+        )
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._jobs: queue.Queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._threads: list[threading.Thread] = []
+        self._alive = 0
+        self._error: Exception | None = None
+        self._started = False
+
+    def _ensure_started(self) -> None:
+        # после fork (gunicorn --preload) потоки родителя не существуют
+        if self._started and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._started:
+                return
+            # ImportError — сразу вызывающему, а не внутри потока
+            from playwright.sync_api import sync_playwright  # noqa: F401
+            for i in range(self.size):
+                t = threading.Thread(target=self._run_slot, name=f"browser-slot-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._alive = self.size
+            self._error = None
+            self._started = True
+
+    def start(self) -> None:
+        """Запустить слоты и браузеры заранее (post_fork), а не на первом рендере."""
+        self._ensure_started()
+
+    def render_pdf(self, html: str) -> bytes:
+        self._ensure_started()
+        # разрешение возвращает слот, когда закончит (или пропустит) задание:
+        # после таймаута вызывающего страница ещё занята, и новые ждут в acquire
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolTimeout(f"no free browser page within {self.acquire_timeout:g}s")
+        fut: Future = Future()
+        with self._lock:
+            # все слоты умерли на старте Playwright — не ждём render_timeout впустую
+            if not self._started:
+                self._slots.release()
+                raise RuntimeError(f"playwright failed to start: {self._error}")
+            self._jobs.put((fut, html))
+        try:
+            return fut.result(timeout=self.render_timeout)
+        except FutureTimeout:
+            fut.cancel()  # ещё в очереди — слот его пропустит
+            raise
+
+    def _slot_failed(self, error: Exception) -> None:
+        with self._lock:
+            self._alive -= 1
+            if self._alive > 0:
+                return
+            # последний слот: следующий render_pdf попробует запуститься заново,
+            # а ждущие в очереди получают ошибку сразу
+            self._error = error
+            self._started = False
+            self._threads = []
+            while True:
+                try:
+                    job = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    continue
+                if job[0].set_running_or_notify_cancel():
+                    job[0].set_exception(error)
+                self._slots.release()
+
+    def _new_page(self, browser):
+        page = browser.new_page()
+        # зависший рендер не держит слот дольше, чем его ждёт вызывающий
+        page.set_default_timeout(self.render_timeout * 1000)
+        return page
+
+    def _run_slot(self) -> None:
+        from playwright.sync_api import sync_playwright
+
+        try:
+            p = sync_playwright().start()
+        except Exception as e:
+            self._slot_failed(e)
+            return
+        try:
+            browser = page = None
+            renders = 0
+
+            def close():
+                nonlocal browser, page, renders
+                try:
+                    if browser is not None:
+                        browser.close()
+                except Exception:
+                    pass
+                browser = page = None
+                renders = 0
+
+            try:
+                browser = p.chromium.launch()
+                page = self._new_page(browser)
+            except Exception:
+                close()  # не вышло — попробуем ещё раз на первом задании
+
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                fut, html = job
+                if not fut.set_running_or_notify_cancel():
+                    self._slots.release()
+                    continue
+                try:
+                    if browser is None or not browser.is_connected():
+                        close()
+                        browser = p.chromium.launch()
+                        page = self._new_page(browser)
+                    page.set_content(html, wait_until="load")
+                    pdf_bytes = page.pdf(
+                        format="Letter",
+                        print_background=True,
+                        prefer_css_page_size=True,
+                    )
+                    renders += 1
+                    fut.set_result(pdf_bytes)
+                except Exception as e:
+                    # упавший/зависший браузер — пересоздаём на следующем задании
+                    close()
+                    fut.set_exception(e)
+                    continue
+                finally:
+                    self._slots.release()
+                if renders >= self.max_renders:
+                    close()
+            close()
+        finally:
+            p.stop()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        if not self._started or self._pid != os.getpid():
+            return
+        with self._lock:
+            for _ in self._threads:
+                self._jobs.put(None)
+            for t in self._threads:
+                t.join(timeout)
+            self._threads = []
+            self._alive = 0
+            self._started = False
+
+
+browser_pool = BrowserPool.from_env()
+atexit.register(browser_pool.shutdown)
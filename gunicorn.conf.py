@@ -0,0 +1,57 @@
+"""
+gunicorn -c gunicorn.conf.py app:app
+
+Мастер остаётся лёгким (fitz/weasyprint не импортируются при загрузке app),
+а каждый воркер сразу после fork в фоне прогревает рендереры — первый
+экспорт уже не платит за импорт, чтение style.css и запуск Chromium
+(BROWSER_PREWARM=0 — браузеры только по первому фолбэку).
+
+При workers > 1 задайте METRICS_DIR (пустой каталог, доступный всем воркерам):
+иначе /metrics отдаёт счётчики только того воркера, что ответил на scrape.
+"""
+import os
+import threading
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+WARM_RENDERERS = os.environ.get("WARM_RENDERERS", "1") == "1"
+
+
+def on_starting(server):
+    from metrics import metrics
+
+    if metrics.directory:
+        metrics.reset()
+    elif workers > 1:
+        server.log.warning("METRICS_DIR is not set: /metrics will only show the worker that answers")
+
+
+def post_fork(server, worker):
+    if not WARM_RENDERERS:
+        return
+
+    def warm():
+        import app
+
+        app.warm_renderers()
+        server.log.info("worker %s: renderers warmed", worker.pid)
+
+    # не держим загрузку воркера: прогрев идёт параллельно с приёмом запросов
+    threading.Thread(target=warm, name="warm-renderers", daemon=True).start()
+
+
+def worker_exit(server, worker):
+    from browser_pool import browser_pool
+
+    browser_pool.shutdown()
+
+
+def child_exit(server, worker):
+    # мастер: счётчики умершего воркера -> retired.json, его pid.json больше не читается
+    from metrics import metrics
+
+    metrics.retire(worker.pid)
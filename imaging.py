@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import math
+import os
+import zipfile
+from concurrent.futures import Executor
+from io import BytesIO
+from typing import TYPE_CHECKING, Callable, Mapping, NamedTuple
+
+if TYPE_CHECKING:
+    import fitz  # PyMuPDF — сам модуль грузим лениво, при первой растеризации
+
+# пресеты размеров: длинная сторона итоговой картинки в пикселях
+SIZE_PRESETS = {"thumb": 320, "preview": 1024}
+LAYOUTS = ("stitch", "zip", "first")
+# libjpeg не пишет стороны больше 65500 px; плюс общий бюджет пикселей на
+# картинку, чтобы склейка длинного табеля не съедала гигабайт памяти
+MAX_SIDE = 65000
+MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 24_000_000))
+MIMETYPES = {"jpeg": "image/jpeg", "png": "image/png"}
+EXTENSIONS = {"jpeg": "jpg", "png": "png"}
+
+
+class ImageOptions(NamedTuple):
+    fmt: str = "jpeg"            # "jpeg" | "png"
+    dpi: int = 200
+    quality: int = 90            # только для JPEG
+    gray: bool = False
+    max_dim: int | None = None   # ограничение длинной стороны, px
+    layout: str = "stitch"       # "stitch" — все страницы одной картинкой, "zip" — по файлу на страницу
+
+    def tag(self) -> str:
+        """Часть ключа кэша: разные параметры — разные артефакты."""
+        return f"dpi={self.dpi};q={self.quality};gray={int(self.gray)};max={self.max_dim or ''};layout={self.layout}"
+
+    @property
+    def mimetype(self) -> str:
+        return "application/zip" if self.layout == "zip" else MIMETYPES[self.fmt]
+
+    @property
+    def extension(self) -> str:
+        return "zip" if self.layout == "zip" else EXTENSIONS[self.fmt]
+
+
+def _flag(v) -> bool:
+    return str(v).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _number(v, name: str) -> float:
+    # из JSON приходят и числа, и Infinity/NaN — round()/int() на них дают OverflowError
+    x = float(v)
+    if not math.isfinite(x):
+        raise ValueError(f"{name} must be a finite number")
+    return x
+
+
+def image_options(values: Mapping, fmt: str, default_dpi: int = 200) -> ImageOptions:
+    """Параметры из формы/JSON: dpi | scale, quality, gray, max_dim | size, pages. ValueError на мусор."""
+    dpi = default_dpi
+    if values.get("dpi"):
+        dpi = int(_number(values["dpi"], "dpi"))
+    elif values.get("scale"):
+        scale = _number(values["scale"], "scale")
+        if not 36 / 72 <= scale <= 600 / 72:
+            raise ValueError("scale must be between 0.5 and 8.33")
+        dpi = round(72 * scale)
+    quality = int(_number(values.get("quality") or 90, "quality"))
+
+    max_dim = int(_number(values["max_dim"], "max_dim")) if values.get("max_dim") else None
+    size = str(values.get("size") or "").lower()
+    if size and size != "full":
+        if size not in SIZE_PRESETS:
+            raise ValueError(f"size must be one of: full, {', '.join(SIZE_PRESETS)}")
+        max_dim = min(max_dim or SIZE_PRESETS[size], SIZE_PRESETS[size])
+
+    layout = str(values.get("pages") or "stitch").lower()
+    if layout not in LAYOUTS:
+        raise ValueError(f"pages must be one of: {', '.join(LAYOUTS)}")
+    if not 36 <= dpi <= 600:
+        raise ValueError("dpi must be between 36 and 600")
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    if max_dim is not None and not 16 <= max_dim <= 20000:
+        raise ValueError("max_dim must be between 16 and 20000")
+
+    return ImageOptions(fmt, dpi, quality, _flag(values.get("gray", "")), max_dim, layout)
+
+
+def _zoom(doc: fitz.Document, opts: ImageOptions, pages: range, max_pixels: int = MAX_PIXELS) -> float:
+    """Масштаб из DPI, урезанный под max_dim, MAX_SIDE и бюджет пикселей итоговой картинки."""
+    rects = [doc[i].rect for i in pages]
+    if opts.layout == "stitch":
+        width, height = max(r.width for r in rects), sum(r.height for r in rects)
+    else:
+        # zip/first: ограничиваем каждую страницу, берём самую большую
+        width, height = max(r.width for r in rects), max(r.height for r in rects)
+    longest = max(width, height)
+    zoom = min(opts.dpi / 72, MAX_SIDE / longest, (max_pixels / (width * height)) ** 0.5)
+    if opts.max_dim:
+        zoom = min(zoom, opts.max_dim / longest)
+    return zoom
+
+
+def _pixmap(doc: fitz.Document, i: int, zoom: float, gray: bool) -> fitz.Pixmap:
+    import fitz
+
+    cs = fitz.csGRAY if gray else fitz.csRGB
+    return doc[i].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=cs, alpha=False)
+
+
+def _encode(pix: fitz.Pixmap, opts: ImageOptions) -> bytes:
+    if opts.fmt == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=opts.quality)
+    return pix.tobytes("png")
+
+
+def _render_page(pdf_bytes: bytes, i: int, zoom: float, opts: ImageOptions, encode: bool):
+    """Одна страница в отдельном процессе: готовый файл или сырые пиксели для склейки."""
+    import fitz
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    pix = _pixmap(doc, i, zoom, opts.gray)
+    if encode:
+        return _encode(pix, opts)
+    return pix.width, pix.height, pix.samples
+
+
+def _stitch(parts: list[fitz.Pixmap], gray: bool) -> fitz.Pixmap:
+    """Страницы одна под другой; список parts при этом опустошается."""
+    import fitz
+
+    width = max(p.width for p in parts)
+    height = sum(p.height for p in parts)
+    out = fitz.Pixmap(fitz.csGRAY if gray else fitz.csRGB, fitz.IRect(0, 0, width, height), False)
+    out.clear_with(255)
+    y = 0
+    parts.reverse()
+    while parts:
+        # страницу отпускаем сразу после копирования: в памяти не две полные картинки
+        p = parts.pop()
+        p.set_origin(0, y)
+        out.copy(p, p.irect)
+        y += p.height
+    return out
+
+
+def rasterize(pdf_bytes: bytes, opts: ImageOptions,
+              pool: Callable[[], Executor] | None = None, parallel_min_pages: int = 4) -> bytes:
+    """
+    PDF -> JPG/PNG со всеми страницами.
+
+    stitch — страницы одна под другой в одной картинке, zip — архив
+    page-01.jpg, page-02.jpg, ..., first — только первая страница.
+    Если страниц не меньше parallel_min_pages и передан pool, страницы
+    рендерятся параллельно в процессах пула.
+    """
+    import fitz
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    pages = range(1 if opts.layout == "first" else doc.page_count)
+    zoom = _zoom(doc, opts, pages)
+    encode = opts.layout == "zip"
+
+    if pool is not None and len(pages) >= parallel_min_pages:
+        executor = pool()
+        futures = [executor.submit(_render_page, pdf_bytes, i, zoom, opts, encode) for i in pages]
+        results = [f.result() for f in futures]
+        if not encode:
+            cs = fitz.csGRAY if opts.gray else fitz.csRGB
+            results = [fitz.Pixmap(cs, w, h, samples, False) for w, h, samples in results]
+    else:
+        results = [_pixmap(doc, i, zoom, opts.gray) for i in pages]
+        if encode:
+            results = [_encode(p, opts) for p in results]
+
+    if encode:
+        buf = BytesIO()
+        ext = EXTENSIONS[opts.fmt]
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+            for n, data in enumerate(results, 1):
+                zf.writestr(f"page-{n:02d}.{ext}", data)
+        return buf.getvalue()
+
+    pix = results[0] if len(results) == 1 else _stitch(results, opts.gray)
+    return _encode(pix, opts)
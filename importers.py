@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import csv
+import io
+import re
+from datetime import date, datetime, timedelta
+from typing import IO, Iterable, Iterator
+from zoneinfo import ZoneInfo
+
+from timesheet import UTC, ZoneOffsets, _zone, parse_date, parse_range_hm, zone_offsets
+
+US_DATE_RGX = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
+CLOCK_RGX = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*([ap]m)?\s*$", re.IGNORECASE)
+ICS_DT_RGX = re.compile(r"^(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})(Z?))?$")
+ICS_DURATION_RGX = re.compile(r"^\+?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+# заголовки CSV -> наши поля (экспорты планировщиков называют их по-разному)
+CSV_COLUMNS = {
+    "date": "date", "day": "date", "work date": "date", "shift date": "date",
+    "range": "range", "time": "range", "shift": "range",
+    "start": "start", "start time": "start", "from": "start", "in": "start", "clock in": "start",
+    "end": "end", "end time": "end", "to": "end", "out": "end", "clock out": "end",
+}
+MAX_SHIFT = 24 * 3600
+
+
+def text_stream(raw: IO[bytes]) -> io.TextIOWrapper:
+    """Байтовый поток загрузки -> построчный текст без чтения файла целиком (BOM Excel съедаем)."""
+    if not hasattr(raw, "readable"):
+        raw = io.BufferedReader(raw)
+    return io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+
+
+# ---------- мелкие парсеры ----------
+def parse_any_date(s: str) -> date | None:
+    """'YYYY-MM-DD' или американское 'MM/DD/YYYY'."""
+    s = s.strip()
+    d = parse_date(s)
+    if d is not None:
+        return d
+    m = US_DATE_RGX.match(s)
+    if not m:
+        return None
+    try:
+        return date(int(m[3]), int(m[1]), int(m[2]))
+    except ValueError:
+        return None
+
+
+def parse_clock(s: str) -> tuple[int, int] | None:
+    """'22:00' или '10:00 pm'."""
+    m = CLOCK_RGX.match(s)
+    if not m:
+        return None
+    h, mi, ampm = int(m[1]), int(m[2]), m[3]
+    if mi > 59:
+        return None
+    if ampm:
+        if not 1 <= h <= 12:
+            return None
+        h = h % 12 + (12 if ampm.lower() == "pm" else 0)
+    elif h > 23:
+        return None
+    return h, mi
+
+
+# ---------- CSV ----------
+def _csv_columns(header: list[str]) -> dict[str, int] | None:
+    cols: dict[str, int] = {}
+    for i, name in enumerate(header):
+        field = CSV_COLUMNS.get(name.strip().lower())
+        if field and field not in cols:
+            cols[field] = i
+    if "start" in cols and "end" in cols:
+        # отдельные колонки точнее: «Shift» рядом с ними бывает названием смены
+        cols.pop("range", None)
+    if "date" in cols and ("range" in cols or ("start" in cols and "end" in cols)):
+        return cols
+    return None
+
+
+def iter_csv(lines: Iterable[str]) -> Iterator[tuple[int, tuple | None, str | None]]:
+    """
+    (номер строки, (day, sh, sm, eh, em) | None, ошибка | None) из CSV построчно.
+
+    С заголовком колонки ищутся по именам (date + range | start/end, лишние
+    колонки игнорируются). Без заголовка: date,range или date,start,end.
+    """
+    reader = csv.reader(lines)
+    cols = None
+    for row in reader:
+        lineno = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        if cols is None:
+            cols = _csv_columns(row)
+            if cols is not None:
+                continue  # это был заголовок
+            cols = {"date": 0, "range": 1} if len(row) == 2 else {"date": 0, "start": 1, "end": 2}
+
+        try:
+            d_str = row[cols["date"]]
+            if "range" in cols:
+                parts = (row[cols["range"]],)
+            else:
+                parts = (row[cols["start"]], row[cols["end"]])
+        except IndexError:
+            yield lineno, None, "missing_columns"
+            continue
+
+        d = parse_any_date(d_str)
+        if d is None:
+            yield lineno, None, "bad_date"
+            continue
+        if len(parts) == 1:
+            hm = parse_range_hm(parts[0].strip())
+        else:
+            s, e = parse_clock(parts[0]), parse_clock(parts[1])
+            hm = s and e and (*s, *e)
+        if not hm:
+            yield lineno, None, "bad_time"
+            continue
+        yield lineno, (d, *hm), None
+
+
+# ---------- iCalendar ----------
+def _unfold(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """RFC 5545: строка, начинающаяся с пробела/таба, — продолжение предыдущей."""
+    buf, start = None, 0
+    for lineno, line in enumerate(lines, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and buf is not None:
+            buf += line[1:]
+            continue
+        if buf is not None:
+            yield start, buf
+        buf, start = line, lineno
+    if buf is not None:
+        yield start, buf
+
+
+def _ics_prop(line: str) -> tuple[str, dict[str, str], str]:
+    head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    return name.upper(), dict(p.partition("=")[::2] for p in params), value.strip()
+
+
+def _wall(dt: datetime) -> tuple[date, int, int, int]:
+    """(день, час, минута, секунды UTC от 0001-01-01) — с этим сравниваются концы события."""
+    off = int(dt.utcoffset().total_seconds())
+    d = dt.date()
+    return d, dt.hour, dt.minute, d.toordinal() * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second - off
+
+
+def _ics_datetime(value: str, params: dict[str, str], tz: ZoneInfo,
+                  offsets: ZoneOffsets) -> tuple[date, int, int, int] | str:
+    """DTSTART/DTEND -> настенное время в зоне табеля (см. _wall) или код ошибки."""
+    m = ICS_DT_RGX.match(value)
+    if not m:
+        return "bad_datetime"
+    if m[4] is None or params.get("VALUE", "").upper() == "DATE":
+        return "all_day_event"
+    y, mo, d, h, mi, sec = int(m[1]), int(m[2]), int(m[3]), int(m[4]), int(m[5]), int(m[6])
+    if h > 23 or mi > 59 or sec > 59:
+        return "bad_datetime"
+    src = tz
+    if m[7]:
+        src = UTC
+    elif params.get("TZID"):
+        src = _zone(params["TZID"].strip('"'))
+        if src is None:
+            return "unknown_tzid"
+    try:
+        day = date(y, mo, d)
+    except ValueError:
+        return "bad_datetime"
+    if src is tz:
+        # частый случай (TZID табеля или «плавающее» время): смещение из кэша по дням, без datetime
+        try:
+            return day, h, mi, day.toordinal() * 86400 + h * 3600 + mi * 60 + sec - offsets.at(day, h, mi)
+        except OverflowError:  # 9999-12-31: следующего дня для кэша смещений нет
+            return "bad_datetime"
+    try:
+        return _wall(datetime(y, mo, d, h, mi, sec, tzinfo=src).astimezone(tz))
+    except OverflowError:  # перевод зоны у 0001-01-01 / 9999-12-31
+        return "bad_datetime"
+
+
+def _ics_duration(value: str) -> timedelta | None:
+    m = ICS_DURATION_RGX.match(value)
+    if not m or not any(m.groups()):
+        return None
+    w, d, h, mi, s = (int(x or 0) for x in m.groups())
+    try:
+        return timedelta(weeks=w, days=d, hours=h, minutes=mi, seconds=s)
+    except OverflowError:
+        return None
+
+
+def _ics_event(props: dict, tz: ZoneInfo, offsets: ZoneOffsets) -> tuple[date, int, int, int, int] | str:
+    if "RRULE" in props or "RDATE" in props:
+        # повторы не разворачиваем: одна смена вместо серии была бы тихой ошибкой
+        return "recurring_event_not_expanded"
+    if "DTSTART" not in props:
+        return "missing_dtstart"
+    start = _ics_datetime(*props["DTSTART"], tz, offsets)
+    if isinstance(start, str):
+        return start
+    if "DTEND" in props:
+        end = _ics_datetime(*props["DTEND"], tz, offsets)
+        if isinstance(end, str):
+            return end
+    elif "DURATION" in props:
+        delta = _ics_duration(props["DURATION"][0])
+        if delta is None:
+            return "bad_duration"
+        if delta.total_seconds() >= MAX_SHIFT:
+            return "bad_range"  # заодно не выходим за datetime.max ниже
+        # длительность — точное время, считаем в UTC
+        try:
+            utc = datetime.fromordinal(1).replace(tzinfo=UTC) + timedelta(seconds=start[3] - 86400) + delta
+            end = _wall(utc.astimezone(tz))
+        except OverflowError:
+            return "bad_duration"
+    else:
+        return "missing_dtend"
+    if not 0 < end[3] - start[3] < MAX_SHIFT:
+        return "bad_range"
+    if (end[1], end[2]) == (start[1], start[2]):
+        # секунды внутри минуты или перевод часов назад: движок прочитал бы это как 24 ч
+        return "bad_range"
+    return start[0], start[1], start[2], end[1], end[2]
+
+
+def iter_ics(lines: Iterable[str], tz: ZoneInfo) -> Iterator[tuple[int, tuple | None, str | None]]:
+    """
+    Смены из .ics: каждый VEVENT с DTSTART и DTEND/DURATION; повторяющиеся
+    (RRULE/RDATE) отклоняются — сервер их не разворачивает.
+
+    Время в UTC и с чужим TZID переводится в зону табеля; дальше длительность
+    считает тот же движок, что и /build. Номер строки — строка BEGIN:VEVENT.
+    """
+    offsets = zone_offsets(tz)
+    props: dict | None = None
+    start_line = 0
+    for lineno, line in _unfold(lines):
+        upper = line.upper()
+        if upper == "BEGIN:VEVENT":
+            props, start_line = {}, lineno
+            continue
+        if props is None:
+            continue
+        if upper == "END:VEVENT":
+            event = _ics_event(props, tz, offsets)
+            if isinstance(event, str):
+                yield start_line, None, event
+            else:
+                yield start_line, event, None
+            props = None
+            continue
+        if not upper.startswith(("DTSTART", "DTEND", "DURATION", "RRULE", "RDATE")):
+            continue  # SUMMARY, DESCRIPTION и прочее не разбираем
+        name, params, value = _ics_prop(line)
+        if name not in props:
+            props[name] = (value, params)
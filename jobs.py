@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    key         TEXT NOT NULL,
+    status      TEXT NOT NULL,          -- queued | running | done | failed
+    mimetype    TEXT,
+    filename    TEXT,
+    result      BLOB,
+    error       TEXT,
+    owner       INTEGER NOT NULL,       -- pid воркера, который выполняет задание
+    heartbeat   REAL NOT NULL,          -- владелец жив, пока обновляет это поле
+    created_at  REAL NOT NULL,
+    finished_at REAL,
+    expires_at  REAL                    -- NULL, пока задание не завершено
+);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs(key, expires_at);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs(expires_at);
+"""
+
+
+class JobQueue:
+    """
+    Фоновые задания экспорта без внешнего брокера.
+
+    Состояние и результаты лежат в SQLite (общий файл для всех воркеров
+    gunicorn), выполнение — в пуле потоков того воркера, который принял задание.
+    Одинаковые задания (по ключу кэша) в полёте не дублируются. Воркер раз в
+    heartbeat секунд отмечает свои незавершённые задания; задание без отметки
+    дольше трёх интервалов (воркер убит/перезапущен) считается упавшим.
+    """
+
+    def __init__(self, db_path: str, concurrency: int = 2, ttl: float = 600.0, heartbeat: float = 10.0):
+        self.db_path = db_path
+        self.concurrency = max(1, concurrency)
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        self._pid = os.getpid()
+        self._active: set[str] = set()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        return cls(
+            db_path=os.environ.get("JOBS_DB") or os.path.join(tempfile.gettempdir(), "work_hours_jobs.sqlite3"),
+            concurrency=int(os.environ.get("JOBS_CONCURRENCY", 2)),
+            ttl=float(os.environ.get("JOBS_RESULT_TTL", 600)),
+            heartbeat=float(os.environ.get("JOBS_HEARTBEAT", 10)),
+        )
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            yield db
+        finally:
+            db.close()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # потоки не переживают fork: в новом воркере заводим свой пул
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="export-job")
+                self._pid = os.getpid()
+                self._active = set()
+                threading.Thread(target=self._beat, name="export-job-heartbeat", daemon=True).start()
+            return self._executor
+
+    def _beat(self) -> None:
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            with self._connect() as db:
+                db.execute(
+                    f"UPDATE jobs SET heartbeat = ? WHERE id IN ({', '.join('?' * len(active))})",
+                    (time.time(), *active),
+                )
+
+    def _reap(self, db: sqlite3.Connection, now: float, job_id: str | None = None) -> None:
+        """Незавершённые задания без свежего heartbeat -> failed (их воркера больше нет)."""
+        sql = (
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, expires_at = ? "
+            "WHERE status IN ('queued', 'running') AND heartbeat < ?"
+        )
+        args = [json.dumps({"error": "worker_lost"}), now, now + self.ttl, now - 3 * self.heartbeat]
+        if job_id is not None:
+            sql += " AND id = ?"
+            args.append(job_id)
+        db.execute(sql, args)
+
+    # ---------- public ----------
+    def submit(self, key: str, fn: Callable[[], tuple[bytes | None, dict]],
+               mimetype: str, filename: str) -> str:
+        """Возвращает id задания; если такое же уже в работе или готово — его id."""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        executor = self._get_executor()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+            self._reap(db, now)
+            row = db.execute(
+                "SELECT id FROM jobs WHERE key = ? AND status != 'failed' "
+                "AND (expires_at IS NULL OR expires_at >= ?) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (key, now),
+            ).fetchone()
+            if row is not None:
+                db.execute("COMMIT")
+                return row["id"]
+            db.execute(
+                "INSERT INTO jobs (id, key, status, mimetype, filename, owner, heartbeat, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, key, mimetype, filename, os.getpid(), now, now),
+            )
+            db.execute("COMMIT")
+        with self._lock:
+            self._active.add(job_id)
+        executor.submit(self._run, job_id, fn)
+        return job_id
+
+    def status(self, job_id: str) -> dict | None:
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT id, status, error, heartbeat, created_at, finished_at, expires_at FROM jobs "
+                "WHERE id = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (job_id, now),
+            ).fetchone()
+            if row is not None and row["status"] in ("queued", "running") \
+                    and row["heartbeat"] < now - 3 * self.heartbeat:
+                self._reap(db, now, job_id)
+                row = db.execute(
+                    "SELECT id, status, error, heartbeat, created_at, finished_at, expires_at FROM jobs WHERE id = ?",
+                    (job_id,),
+                ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        del job["heartbeat"]
+        job["error"] = json.loads(job["error"]) if job["error"] else None
+        return job
+
+    def result(self, job_id: str) -> tuple[bytes, str, str] | None:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT result, mimetype, filename FROM jobs "
+                "WHERE id = ? AND status = 'done' AND expires_at >= ?",
+                (job_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return bytes(row["result"]), row["mimetype"], row["filename"]
+
+    # ---------- worker ----------
+    def _run(self, job_id: str, fn: Callable[[], tuple[bytes | None, dict]]) -> None:
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'running', heartbeat = ? WHERE id = ?", (time.time(), job_id))
+        try:
+            data, errors = fn()
+        except Exception as e:
+            data, errors = None, {"error": "job_failed", "detail": str(e)}
+
+        now = time.time()
+        with self._lock:
+            self._active.discard(job_id)
+        # срок жизни результата отсчитывается от завершения, а не от постановки в очередь
+        with self._connect() as db:
+            if data is None:
+                db.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, expires_at = ? WHERE id = ?",
+                    (json.dumps(errors, ensure_ascii=False), now, now + self.ttl, job_id),
+                )
+            else:
+                db.execute(
+                    "UPDATE jobs SET status = 'done', result = ?, finished_at = ?, expires_at = ? WHERE id = ?",
+                    (data, now, now + self.ttl, job_id),
+                )
+
+
+job_queue = JobQueue.from_env()
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterable
+
+from timesheet import Shift, parse_date, parse_hhmm, resolve_tz, totals_of, zone_offsets
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS live_sessions (
+    id          TEXT PRIMARY KEY,
+    tz          TEXT NOT NULL,
+    subtotal_h  INTEGER NOT NULL DEFAULT 0,
+    subtotal_m  INTEGER NOT NULL DEFAULT 0,
+    dst_rows    INTEGER NOT NULL DEFAULT 0,   -- сколько строк пересекают перевод часов
+    row_count   INTEGER NOT NULL DEFAULT 0,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS live_sessions_updated ON live_sessions(updated_at);
+CREATE TABLE IF NOT EXISTS live_rows (
+    session_id  TEXT NOT NULL,
+    row_id      TEXT NOT NULL,
+    work_date   TEXT NOT NULL,
+    start       TEXT NOT NULL,
+    "end"       TEXT NOT NULL,
+    minutes     INTEGER NOT NULL,
+    dst         INTEGER NOT NULL,
+    PRIMARY KEY (session_id, row_id)
+) WITHOUT ROWID;
+"""
+
+UPSERT_OPS = ("add", "edit", "set")
+
+
+def _compute(tz, row: dict) -> Shift | None:
+    d = parse_date((row.get("date") or "").strip())
+    s = d and parse_hhmm(row.get("start") or "")
+    e = s and parse_hhmm(row.get("end") or "")
+    return Shift(d, *s, *e, zone_offsets(tz)) if e else None
+
+
+def _row_result(row_id: str, shift: Shift | None) -> dict:
+    if shift is None:
+        return {"id": row_id, "valid": False}
+    return {"id": row_id, "valid": True, "h": shift.h, "m": f"{shift.m:02d}", "dst": shift.dst}
+
+
+class LiveTotals:
+    """
+    Живые итоги формы: строки и текущие суммы сессии лежат в SQLite
+    (общий файл для воркеров gunicorn). Изменение строки — дельта к суммам,
+    без пересчёта остальных строк; полный пересчёт только при смене зоны.
+    """
+
+    def __init__(self, db_path: str, ttl: float = 12 * 3600.0, max_changes: int = 500):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_changes = max_changes
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "LiveTotals":
+        return cls(
+            db_path=os.environ.get("LIVE_DB") or os.path.join(tempfile.gettempdir(), "work_hours_live.sqlite3"),
+            ttl=float(os.environ.get("LIVE_SESSION_TTL", 12 * 3600)),
+            max_changes=int(os.environ.get("LIVE_MAX_CHANGES", 500)),
+        )
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            yield db
+        finally:
+            db.close()
+
+    # ---------- public ----------
+    def apply(self, session_id: str | None, tz_name: str | None, changes: Iterable[dict]) -> dict:
+        """
+        changes: [{op: add|edit|set, id, date, start, end} | {op: remove, id}].
+
+        Неизвестная/просроченная сессия -> новая пустая и reset=True: клиент
+        должен прислать все строки заново. Неполная строка в итогах не
+        участвует, но в ответе есть с valid=False.
+        """
+        if not isinstance(session_id or "", str) or not isinstance(tz_name or "", str):
+            raise ValueError("session and tz must be strings")
+        changes = list(changes)
+        if len(changes) > self.max_changes:
+            raise ValueError(f"at most {self.max_changes} changes per request")
+        for ch in changes:
+            if not isinstance(ch, dict) or ch.get("id") in (None, ""):
+                raise ValueError("each change needs an id")
+            if (ch.get("op") or "set") not in (*UPSERT_OPS, "remove"):
+                raise ValueError("op must be add, edit, set or remove")
+            if not isinstance(ch["id"], (str, int)) or isinstance(ch["id"], bool):
+                raise ValueError("id must be a string or an integer")
+            for field in ("date", "start", "end"):
+                if not isinstance(ch.get(field) or "", str):
+                    raise ValueError(f"{field} must be a string")
+
+        tz_name, tz = resolve_tz(tz_name)
+        now = time.time()
+        reset = False
+        out_rows: dict[str, dict] = {}
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            sess = None
+            if session_id:
+                sess = db.execute(
+                    "SELECT * FROM live_sessions WHERE id = ? AND updated_at >= ?",
+                    (session_id, now - self.ttl),
+                ).fetchone()
+            if sess is None:
+                reset = bool(session_id)
+                session_id = uuid.uuid4().hex
+                self._expire(db, now)
+                db.execute(
+                    "INSERT INTO live_sessions (id, tz, updated_at) VALUES (?, ?, ?)",
+                    (session_id, tz_name, now),
+                )
+                sess = {"tz": tz_name, "subtotal_h": 0, "subtotal_m": 0, "dst_rows": 0, "row_count": 0}
+
+            acc = [sess["subtotal_h"], sess["subtotal_m"], sess["dst_rows"], sess["row_count"]]
+            if sess["tz"] != tz_name:
+                # другая зона меняет длительность всех строк — единственный O(n) случай
+                acc = [0, 0, 0, 0]
+                for r in db.execute("SELECT * FROM live_rows WHERE session_id = ?", (session_id,)).fetchall():
+                    shift = _compute(tz, {"date": r["work_date"], "start": r["start"], "end": r["end"]})
+                    self._put(db, session_id, r["row_id"], shift, None, acc)
+                    out_rows[r["row_id"]] = _row_result(r["row_id"], shift)
+
+            for ch in changes:
+                row_id = str(ch["id"])
+                old = db.execute(
+                    "SELECT * FROM live_rows WHERE session_id = ? AND row_id = ?", (session_id, row_id),
+                ).fetchone()
+                shift = None if ch.get("op") == "remove" else _compute(tz, ch)
+                if old is not None:
+                    self._sub(acc, old["minutes"], old["dst"])
+                self._put(db, session_id, row_id, shift, old, acc)
+                out_rows[row_id] = {"id": row_id, "removed": True} if ch.get("op") == "remove" \
+                    else _row_result(row_id, shift)
+
+            db.execute(
+                "UPDATE live_sessions SET tz = ?, subtotal_h = ?, subtotal_m = ?, dst_rows = ?, "
+                "row_count = ?, updated_at = ? WHERE id = ?",
+                (tz_name, *acc, now, session_id),
+            )
+            db.execute("COMMIT")
+
+        return {
+            "session": session_id,
+            "reset": reset,
+            "tz": tz_name,
+            "rows": list(out_rows.values()),
+            "row_count": acc[3],
+            "max_changes": self.max_changes,
+            **totals_of(acc[0], acc[1], acc[2] > 0),
+        }
+
+    def drop(self, session_id: str) -> None:
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM live_rows WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM live_sessions WHERE id = ?", (session_id,))
+            db.execute("COMMIT")
+
+    # ---------- internals ----------
+    @staticmethod
+    def _sub(acc: list[int], minutes: int, dst: int) -> None:
+        h, m = divmod(minutes, 60)
+        acc[0] -= h
+        acc[1] -= m
+        acc[2] -= dst
+        acc[3] -= 1
+
+    @staticmethod
+    def _put(db: sqlite3.Connection, session_id: str, row_id: str, shift: Shift | None,
+             old: sqlite3.Row | None, acc: list[int]) -> None:
+        """Записать строку (или удалить, если она невалидна) и добавить её вклад в acc."""
+        if shift is None:
+            if old is not None:
+                db.execute("DELETE FROM live_rows WHERE session_id = ? AND row_id = ?", (session_id, row_id))
+            return
+        start = f"{shift.sh:02d}:{shift.sm:02d}"
+        end = f"{shift.eh:02d}:{shift.em:02d}"
+        db.execute(
+            'INSERT INTO live_rows (session_id, row_id, work_date, start, "end", minutes, dst) '
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            'ON CONFLICT (session_id, row_id) DO UPDATE SET work_date = excluded.work_date, '
+            'start = excluded.start, "end" = excluded."end", minutes = excluded.minutes, dst = excluded.dst',
+            (session_id, row_id, shift.day.isoformat(), start, end, shift.minutes, int(shift.dst)),
+        )
+        h, m = divmod(shift.minutes, 60)
+        acc[0] += h
+        acc[1] += m
+        acc[2] += int(shift.dst)
+        acc[3] += 1
+
+    def _expire(self, db: sqlite3.Connection, now: float) -> None:
+        # чистим при создании сессии: заброшенные вкладки не копятся
+        cutoff = now - self.ttl
+        db.execute(
+            "DELETE FROM live_rows WHERE session_id IN (SELECT id FROM live_sessions WHERE updated_at < ?)",
+            (cutoff,),
+        )
+        db.execute("DELETE FROM live_sessions WHERE updated_at < ?", (cutoff,))
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import atexit
+import cProfile
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Flask, Response, g, has_request_context, request
+from werkzeug.wsgi import ClosingIterator
+
+log = logging.getLogger("work_hours.metrics")
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20, 100 << 20)
+RETIRED = "retired.json"  # сумма завершившихся воркеров
+
+HELP = {
+    "wh_request_seconds": ("histogram", "Request duration including response send, by endpoint."),
+    "wh_stage_seconds": ("histogram", "Duration of a render/build stage."),
+    "wh_payload_bytes": ("histogram", "Payload sizes: request/response bodies, PDFs and images."),
+    "wh_renderer_total": ("counter", "Which renderer produced the PDF (cache = served from render cache)."),
+    "wh_render_fallback_total": ("counter", "Falls back from WeasyPrint to Playwright, by exception type."),
+    "wh_render_errors_total": ("counter", "Render pipeline failures, by stage and exception type."),
+    "wh_requests_total": ("counter", "Finished requests, by endpoint and status."),
+}
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(v: float) -> str:
+    # без экспоненты и потери точности: 1048576, а не 1.04858e+06
+    v = float(v)
+    return str(int(v)) if v.is_integer() else repr(v)
+
+
+def _labels_key(labels: dict) -> str:
+    return json.dumps(sorted(labels.items()), separators=(",", ":"))
+
+
+class Metrics:
+    """
+    Счётчики и гистограммы в памяти процесса.
+
+    Если задан METRICS_DIR, каждый воркер gunicorn периодически сбрасывает
+    свои значения в METRICS_DIR/<pid>.json, а /metrics складывает все файлы —
+    поэтому неважно, какой воркер ответил на scrape. Сброс не чаще
+    flush_interval; пропущенное дописывает фоновый поток воркера.
+    При нескольких воркерах METRICS_DIR обязателен: без него /metrics
+    показывает только ответившего.
+    Файл умершего воркера мастер вливает в retired.json (gunicorn child_exit),
+    так что счётчики не откатываются и новый воркер с тем же pid начинает с нуля.
+    """
+
+    def __init__(self, directory: str | None = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, str], float] = {}
+        self._hists: dict[tuple[str, str], list[float]] = {}
+        self._buckets: dict[str, tuple[float, ...]] = {}
+        self._last_flush = 0.0
+        self._dirty = False
+        self._flusher_pid: int | None = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "Metrics":
+        return cls(
+            directory=os.environ.get("METRICS_DIR") or None,
+            flush_interval=float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0)),
+        )
+
+    # ---------- запись ----------
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            self._dirty = True
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = TIME_BUCKETS, **labels) -> None:
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._buckets.setdefault(name, buckets)
+            h = self._hists.get(key)
+            if h is None:
+                # [count в каждом ведре..., +Inf, sum]
+                h = self._hists[key] = [0.0] * (len(buckets) + 2)
+            for i, b in enumerate(buckets):
+                if value <= b:
+                    h[i] += 1
+                    break
+            else:
+                h[len(buckets)] += 1
+            h[-1] += value
+            self._dirty = True
+
+    # ---------- мультипроцесс ----------
+    def _snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [[n, lk, v] for (n, lk), v in self._counters.items()],
+                "hists": [[n, lk, list(h)] for (n, lk), h in self._hists.items()],
+                "buckets": {n: list(b) for n, b in self._buckets.items()},
+            }
+
+    def flush(self, force: bool = False) -> None:
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if not force:
+            self._ensure_flusher()
+            if now - self._last_flush < self.flush_interval:
+                return  # не потеряется: хвост допишет фоновый поток
+        self._last_flush = now
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        try:
+            with self._lock:
+                self._dirty = False
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._snapshot(), f)
+            os.replace(tmp, path)
+        except OSError:
+            log.exception("metrics: flush failed")
+
+    def _ensure_flusher(self) -> None:
+        # свой поток в каждом воркере: потоки мастера fork не переживают
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        self._flusher_pid = pid
+        threading.Thread(target=self._flush_loop, args=(pid,), name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self, pid: int) -> None:
+        """Отложенный сброс: всплеск внутри flush_interval виден другим воркерам и в простое."""
+        while self._flusher_pid == pid:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush(force=True)
+
+    def retire(self, pid: int) -> None:
+        """Влить METRICS_DIR/<pid>.json завершившегося воркера в retired.json (из мастера)."""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"{pid}.json")
+        if not os.path.exists(path):
+            return
+        merged = self._merge([os.path.join(self.directory, RETIRED), path])
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(merged, f)
+            os.replace(tmp, os.path.join(self.directory, RETIRED))
+            os.remove(path)
+        except OSError:
+            log.exception("metrics: retire of worker %s failed", pid)
+
+    def reset(self) -> None:
+        """Старт мастера: файлы прошлого запуска не относятся к новым воркерам."""
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _merge(paths) -> dict:
+        counters: dict[tuple[str, str], float] = {}
+        hists: dict[tuple[str, str], list[float]] = {}
+        buckets: dict[str, list[float]] = {}
+        for path in paths:
+            try:
+                with open(path) as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            buckets.update(snap["buckets"])
+            for n, lk, v in snap["counters"]:
+                counters[(n, lk)] = counters.get((n, lk), 0.0) + v
+            for n, lk, h in snap["hists"]:
+                acc = hists.get((n, lk))
+                hists[(n, lk)] = h if acc is None else [a + b for a, b in zip(acc, h)]
+        return {
+            "counters": [[n, lk, v] for (n, lk), v in counters.items()],
+            "hists": [[n, lk, h] for (n, lk), h in hists.items()],
+            "buckets": buckets,
+        }
+
+    def _collect(self) -> dict:
+        if not self.directory:
+            return self._snapshot()
+        self.flush(force=True)
+        return self._merge(glob.glob(os.path.join(self.directory, "*.json")))
+
+    # ---------- экспозиция ----------
+    def render(self) -> str:
+        data = self._collect()
+        by_name: dict[str, list[str]] = {}
+
+        def fmt_labels(lk: str, extra: tuple[str, str] | None = None) -> str:
+            pairs = json.loads(lk)
+            if extra:
+                pairs.append(list(extra))
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        for n, lk, v in sorted(data["counters"]):
+            by_name.setdefault(n, []).append(f"{n}{fmt_labels(lk)} {_num(v)}")
+        for n, lk, h in sorted(data["hists"]):
+            lines = by_name.setdefault(n, [])
+            cumulative = 0.0
+            for b, c in zip(data["buckets"][n], h):
+                cumulative += c
+                lines.append(f"{n}_bucket{fmt_labels(lk, ('le', repr(float(b))))} {_num(cumulative)}")
+            cumulative += h[len(data['buckets'][n])]
+            lines.append(f"{n}_bucket{fmt_labels(lk, ('le', '+Inf'))} {_num(cumulative)}")
+            lines.append(f"{n}_sum{fmt_labels(lk)} {_num(h[-1])}")
+            lines.append(f"{n}_count{fmt_labels(lk)} {_num(cumulative)}")
+
+        out = []
+        for n in sorted(by_name):
+            kind, text = HELP.get(n, ("untyped", n))
+            out.append(f"# HELP {n} {text}")
+            out.append(f"# TYPE {n} {kind}")
+            out.extend(by_name[n])
+        return "\n".join(out) + "\n"
+
+
+metrics = Metrics.from_env()
+atexit.register(metrics.flush, True)
+
+
+@contextmanager
+def stage(name: str):
+    """Замер этапа: гистограмма wh_stage_seconds + разбивка для лога медленных запросов."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        metrics.observe("wh_stage_seconds", dt, stage=name)
+        if has_request_context():
+            g.setdefault("wh_stages", []).append((name, dt))
+
+
+def observe_bytes(kind: str, size: int | None) -> None:
+    if size is not None:
+        metrics.observe("wh_payload_bytes", size, SIZE_BUCKETS, kind=kind)
+
+
+def install(app: Flask) -> None:
+    """Хуки таймингов запросов, лог медленных запросов с выборочным профилем и /metrics."""
+    slow_ms = float(os.environ.get("SLOW_REQUEST_MS", 0) or 0)
+    sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", 0) or 0)
+
+    @app.before_request
+    def _metrics_start():
+        g.wh_t0 = time.perf_counter()
+        observe_bytes("request", request.content_length)
+        if slow_ms and sample_rate and random.random() < sample_rate:
+            g.wh_profiler = cProfile.Profile()
+            g.wh_profiler.enable()
+
+    @app.after_request
+    def _metrics_finish(response):
+        t0 = g.get("wh_t0")
+        if t0 is None:
+            return response
+        profiler = g.pop("wh_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+        endpoint = request.endpoint or "unknown"
+        method, path = request.method, request.path
+        stages = g.get("wh_stages", [])
+        if not response.is_streamed:
+            observe_bytes("response", response.content_length)
+
+        def finish():
+            # вызывается после отправки тела — время включает send
+            dt = time.perf_counter() - t0
+            status = str(response.status_code)
+            metrics.observe("wh_request_seconds", dt, endpoint=endpoint, method=method)
+            metrics.inc("wh_requests_total", endpoint=endpoint, status=status)
+            if slow_ms and dt * 1000 >= slow_ms:
+                breakdown = ", ".join(f"{n}={s * 1000:.1f}ms" for n, s in stages) or "-"
+                msg = f"slow request {method} {path} {status} {dt * 1000:.1f}ms [{breakdown}]"
+                if profiler is not None:
+                    buf = io.StringIO()
+                    pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(15)
+                    msg += "\n" + buf.getvalue()
+                log.warning(msg)
+            metrics.flush()
+
+        if response.direct_passthrough:
+            # send_file: werkzeug отдаёт итератор как есть и _on_close не вызывает
+            response.response = ClosingIterator(response.response, finish)
+        else:
+            response.call_on_close(finish)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
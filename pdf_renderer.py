@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import mimetypes
+import os
+import re
+import threading
+from functools import partial
+from typing import Callable
+from urllib.parse import unquote, urlsplit
+
+from werkzeug.security import safe_join
+
+# <base href='...'> вставляет app._inject_base
+_BASE_RGX = re.compile(r"<base\s+href=['\"]([^'\"]*)['\"]", re.IGNORECASE)
+
+
+def base_url_of(html: str) -> str | None:
+    m = _BASE_RGX.search(html)
+    return m[1] if m else None
+
+
+class WeasyRenderer:
+    """
+    WeasyPrint с заранее загруженными стилями.
+
+    weasyprint импортируется при первом рендере (или в load() из post_fork),
+    style.css читается с диска один раз и перечитывается только при смене
+    mtime, FontConfiguration общий. Запросы к /static того же хоста отдаются
+    с диска, а не HTTP-запросом воркера к самому себе; стили — только те, на
+    которые ссылается документ, и с авторским приоритетом, как в браузере.
+    """
+
+    def __init__(self, static_dir: str, static_url_path: str = "/static",
+                 stylesheets: tuple[str, ...] = ("style.css",),
+                 resolve: Callable[[str], str] | None = None):
+        self.static_dir = static_dir
+        self.resolve = resolve  # имя с хэшем из url_for -> файл в static/
+        self.static_url_path = static_url_path.rstrip("/") + "/"
+        self.stylesheets = stylesheets
+        self._lock = threading.Lock()
+        self._weasy = None
+        self._import_error: Exception | None = None
+        self._fonts = None
+        self._css: dict[str, bytes] = {}
+        self._mtimes: tuple[float, ...] = ()
+
+    @classmethod
+    def from_env(cls, static_dir: str, static_url_path: str = "/static",
+                 resolve: Callable[[str], str] | None = None) -> "WeasyRenderer":
+        names = os.environ.get("PDF_STYLESHEETS", "style.css")
+        return cls(static_dir, static_url_path, tuple(n.strip() for n in names.split(",") if n.strip()), resolve)
+
+    # ---------- загрузка ----------
+    def _stat(self) -> tuple[float, ...]:
+        out = []
+        for name in self.stylesheets:
+            try:
+                out.append(os.stat(os.path.join(self.static_dir, name)).st_mtime)
+            except OSError:
+                out.append(0.0)
+        return tuple(out)
+
+    def load(self) -> None:
+        """Импорт weasyprint и чтение стилей; повторный вызов — только проверка mtime."""
+        if self._import_error is not None:
+            # без pango/cairo импорт падает каждый раз и стоит сотни мс — не повторяем
+            raise self._import_error
+        mtimes = self._stat()
+        if self._weasy is not None and mtimes == self._mtimes:
+            return
+        with self._lock:
+            if self._weasy is None:
+                try:
+                    import weasyprint
+                    from weasyprint.text.fonts import FontConfiguration
+                except Exception as e:
+                    self._import_error = e
+                    raise
+
+                self._fonts = FontConfiguration()
+                self._weasy = weasyprint
+            if mtimes != self._mtimes:
+                css = {}
+                for name in self.stylesheets:
+                    try:
+                        with open(os.path.join(self.static_dir, name), "rb") as f:
+                            css[os.path.normpath(name)] = f.read()
+                    except OSError:
+                        pass
+                self._css = css
+                self._mtimes = mtimes
+
+    # ---------- url_fetcher ----------
+    def _local_path(self, origin: tuple[str, str] | None, url: str) -> str | None:
+        parts = urlsplit(url)
+        if origin is None or (parts.scheme, parts.netloc) != origin:
+            return None
+        path = unquote(parts.path)
+        if not path.startswith(self.static_url_path):
+            return None
+        name = path[len(self.static_url_path):]
+        return safe_join(self.static_dir, self.resolve(name) if self.resolve else name)
+
+    def fetch(self, origin: tuple[str, str] | None, url: str) -> dict:
+        path = self._local_path(origin, url)
+        if path is None:
+            return self._weasy.default_url_fetcher(url)
+        css = self._css.get(os.path.relpath(path, self.static_dir))
+        if css is not None:
+            # <link> документа: авторские стили, а не user-origin из write_pdf(stylesheets=...)
+            return {"string": css, "mime_type": "text/css", "redirected_url": url}
+        mime = mimetypes.guess_type(path)[0]
+        with open(path, "rb") as f:
+            return {"string": f.read(), "mime_type": mime, "redirected_url": url}
+
+    # ---------- рендер ----------
+    def render_pdf(self, html: str, base_url: str | None = None) -> bytes:
+        self.load()
+        base_url = base_url or base_url_of(html)
+        origin = None
+        if base_url:
+            parts = urlsplit(base_url)
+            origin = (parts.scheme, parts.netloc)
+        doc = self._weasy.HTML(string=html, base_url=base_url, url_fetcher=partial(self.fetch, origin))
+        return doc.write_pdf(font_config=self._fonts)
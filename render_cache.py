@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+_WS_RGX = re.compile(r"\s+")
+
+
+def normalize_html(html: str) -> str:
+    # пробелы между тегами на рендер не влияют, а outerHTML их плодит
+    return _WS_RGX.sub(" ", html).strip()
+
+
+class RenderCache:
+    """
+    Контент-адресный кэш готовых PDF/JPG/PNG.
+
+    Два уровня: LRU в памяти (ограничен по байтам и количеству) и, если задан
+    каталог, диск с вытеснением самых старых файлов по суммарному размеру.
+    """
+
+    def __init__(self, max_items: int = 64, max_bytes: int = 64 << 20,
+                 disk_dir: str | None = None, disk_max_bytes: int = 512 << 20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_bytes = 0
+        self._disk_bytes: int | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "RenderCache":
+        return cls(
+            max_items=int(os.environ.get("RENDER_CACHE_ITEMS", 64)),
+            max_bytes=int(os.environ.get("RENDER_CACHE_MAX_BYTES", 64 << 20)),
+            disk_dir=os.environ.get("RENDER_CACHE_DIR") or None,
+            disk_max_bytes=int(os.environ.get("RENDER_CACHE_DISK_BYTES", 512 << 20)),
+        )
+
+    @staticmethod
+    def key(html: str, fmt: str, variant: str = "", renderer: str = "") -> str:
+        """variant — параметры растеризации (DPI, качество и т.п.), renderer — цепочка рендереров."""
+        h = hashlib.sha256()
+        for part in (fmt, variant, renderer):
+            h.update(part.encode())
+            h.update(b"\0")
+        h.update(normalize_html(html).encode("utf-8"))
+        return h.hexdigest()
+
+    # ---------- public ----------
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return data
+        data = self._disk_get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._mem_put(key, data)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._mem_put(key, data)
+        self._disk_put(key, data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "items": len(self._mem),
+                "bytes": self._mem_bytes,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    # ---------- memory ----------
+    def _mem_put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._mem_bytes -= len(old)
+        self._mem[key] = data
+        self._mem_bytes += len(data)
+        while self._mem and (len(self._mem) > self.max_items or self._mem_bytes > self.max_bytes):
+            _, evicted = self._mem.popitem(last=False)
+            self._mem_bytes -= len(evicted)
+
+    # ---------- disk ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key: str) -> bytes | None:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # для вытеснения «самых старых»
+            return data
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, data: bytes) -> None:
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # атомарная запись: воркеры gunicorn делят один каталог
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk()[1]
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self) -> tuple[list[tuple[float, int, str]], int]:
+        entries, total = [], 0
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                p = os.path.join(root, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+        return entries, total
+
+    def _evict_disk(self) -> None:
+        entries, total = self._scan_disk()
+        entries.sort()
+        # чистим до 90% лимита, чтобы не сканировать каталог на каждой записи
+        target = self.disk_max_bytes * 9 // 10
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+
+render_cache = RenderCache.from_env()
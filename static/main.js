@@ -184,6 +184,7 @@ document.addEventListener('DOMContentLoaded', () => {
       last_name:  lastName?.value || '',
       first_name: firstName?.value || '',
       year:       yearInput?.value || '',
+      tz:         document.getElementById('tz')?.value || '',
       rows
     };
     try { localStorage.setItem(STORAGE_KEY, JSON.stringify(draft)); } catch (_) {}
@@ -202,10 +203,80 @@ document.addEventListener('DOMContentLoaded', () => {
   };
   const saveDraftDebounced = debounce(saveDraft, 250);
 
+  // --- живые итоги: на сервер уходят только изменённые строки ---
+  const LIVE_KEY = 'wh_live_session';
+  const liveBox = document.getElementById('liveTotals');
+  const liveChanges = new Map();   // id строки -> последнее изменение
+  let liveRowSeq = 0;
+  const newRowId = () => `r${Date.now().toString(36)}${(liveRowSeq++).toString(36)}`;
+
+  const rowChange = (tr) => ({
+    op: 'set',
+    id: tr.dataset.rowId,
+    date:  tr.querySelector('.date-input')?.value || '',
+    start: tr.querySelector('.time-input.start')?.value || '',
+    end:   tr.querySelector('.time-input.end')?.value || '',
+  });
+
+  // сервер принимает не больше max_changes строк за запрос (LIVE_MAX_CHANGES)
+  let liveBatch = 500;
+
+  const postLive = (changes) => fetch('/api/live', {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({
+      session: sessionStorage.getItem(LIVE_KEY),
+      tz: document.getElementById('tz')?.value || '',
+      changes
+    })
+  }).then(r => r.ok ? r.json() : null);
+
+  async function flushLive(all = false) {
+    if (!liveBox) return;
+    const changes = all
+      ? [...tbody.querySelectorAll('tr')].map(rowChange)
+      : [...liveChanges.values()];
+    liveChanges.clear();
+    if (!changes.length && !all) return;
+
+    // большая форма (например, после импорта) уходит пачками в одну сессию
+    let res;
+    for (let i = 0; i === 0 || i < changes.length; i += liveBatch) {
+      const batch = changes.slice(i, i + liveBatch);
+      try {
+        res = await postLive(batch);
+      } catch (_) { return; }
+      if (!res) return;
+
+      sessionStorage.setItem(LIVE_KEY, res.session);
+      if (res.max_changes) liveBatch = res.max_changes;
+      // сервер не знает сессию (истекла/перезапуск) — шлём все строки заново;
+      // первая пачка полной синхронизации и так открывает новую сессию
+      if (res.reset && !(all && i === 0)) return flushLive(true);
+
+      res.rows.forEach(r => {
+        const out = tbody.querySelector(`tr[data-row-id="${r.id}"] .row-hours`);
+        if (out) out.textContent = r.valid ? `${r.h}h ${r.m}m${r.dst ? ' ⏰' : ''}` : '';
+      });
+    }
+    liveBox.textContent = `Total: ${res.total_h}h ${res.total_m}m` +
+      (res.dst_note ? ' — includes a DST change' : '');
+  }
+  // запросы строго по очереди: иначе два первых ответа заведут две сессии
+  let liveQueue = Promise.resolve();
+  const flushLiveQueued = (all = false) => { liveQueue = liveQueue.then(() => flushLive(all)); };
+  const flushLiveDebounced = debounce(() => flushLiveQueued(), 150);
+
+  const queueLive = (change) => {
+    liveChanges.set(change.id, change);
+    flushLiveDebounced();
+  };
+
   // --- построитель строки ---
   function addRow(prefill=null) {
     const tr = document.createElement('tr');
     tr.classList.add('scale-up-right');
+    tr.dataset.rowId = newRowId();
 
     // Date
     const tdDate = document.createElement('td');
@@ -250,13 +321,18 @@ document.addEventListener('DOMContentLoaded', () => {
     // Preview + hidden
     const tdPreview = document.createElement('td');
     const preview = document.createElement('div'); preview.className = 'range-preview';
+    const hours = document.createElement('div'); hours.className = 'row-hours muted';
     const hiddenRange = document.createElement('input'); hiddenRange.type = 'hidden'; hiddenRange.name = 'range[]';
-    tdPreview.append(preview, hiddenRange);
+    tdPreview.append(preview, hours, hiddenRange);
 
     // Remove
     const tdDel = document.createElement('td'); tdDel.className = 'noprint';
     const delBtn = document.createElement('button'); delBtn.type = 'button'; delBtn.className = 'btn danger'; delBtn.textContent = '×';
-    delBtn.addEventListener('click', () => { tr.remove(); saveDraftDebounced(); });
+    delBtn.addEventListener('click', () => {
+      tr.remove();
+      saveDraftDebounced();
+      queueLive({ op: 'remove', id: tr.dataset.rowId });
+    });
     tdDel.appendChild(delBtn);
 
     function update() {
@@ -270,6 +346,7 @@ document.addEventListener('DOMContentLoaded', () => {
         hiddenRange.value = '';
       }
       saveDraftDebounced();
+      queueLive(rowChange(tr));
     }
     dateInput.addEventListener('change', update);
     startInput.addEventListener('change', update);
@@ -302,6 +379,14 @@ document.addEventListener('DOMContentLoaded', () => {
     addRow();
   }
 
+  // Черновик восстановлен в строки с новыми id — заводим свежую сессию одним пакетом
+  const staleLive = sessionStorage.getItem(LIVE_KEY);
+  if (staleLive) {
+    sessionStorage.removeItem(LIVE_KEY);
+    fetch(`/api/live/${staleLive}`, { method: 'DELETE' }).catch(() => {});
+  }
+  flushLiveQueued(true);
+
   // Сохранять при любом вводе
   form.addEventListener('input', saveDraftDebounced);
 
@@ -325,6 +410,12 @@ if (clearBtn) {
     if (!ok) return;
 
     localStorage.removeItem('wh_draft_v1');
+    const liveSession = sessionStorage.getItem(LIVE_KEY);
+    if (liveSession) {
+      sessionStorage.removeItem(LIVE_KEY);
+      fetch(`/api/live/${liveSession}`, { method: 'DELETE' }).catch(() => {});
+    }
+    liveChanges.clear();
     tbody.innerHTML = '';
     addRow();
     document.querySelector('input[name="last_name"]').value = '';
@@ -347,6 +438,34 @@ document.addEventListener('DOMContentLoaded', () => {
   const btnPdf = document.getElementById('savePdfBtn');
   const btnJpg = document.getElementById('saveJpgBtn');
 
+  async function waitForJob(job, { interval = 400, timeout = 120000 } = {}) {
+    const deadline = Date.now() + timeout;
+    while (Date.now() < deadline) {
+      const st = await fetch(job.status_url).then(r => r.json());
+      if (st.status === 'done') {
+        const res = await fetch(job.result_url);
+        if (res.ok) return res;
+        throw new Error(`HTTP ${res.status}`);
+      }
+      if (st.status === 'failed' || st.error === 'unknown_job') {
+        throw new Error((st.error && st.error.error) || st.error || 'job_failed');
+      }
+      await new Promise(r => setTimeout(r, interval));
+    }
+    throw new Error('Export timed out');
+  }
+
+  // Большие тела (outerHTML страницы) жмём gzip, если браузер умеет CompressionStream
+  async function postBody(body, contentType) {
+    const headers = { 'Content-Type': contentType };
+    if (typeof CompressionStream === 'undefined' || body.length < 4096) return { headers, body };
+    const stream = new Blob([body]).stream().pipeThrough(new CompressionStream('gzip'));
+    return {
+      headers: { ...headers, 'Content-Encoding': 'gzip' },
+      body: await new Response(stream).blob()
+    };
+  }
+
   async function exportFile(fmt) {
     const btn = fmt === 'pdf' ? btnPdf : btnJpg;
     if (!btn) return;
@@ -357,20 +476,31 @@ document.addEventListener('DOMContentLoaded', () => {
     btn.textContent = 'Preparing...';
 
     try {
-      // Берём весь HTML текущей страницы. Можно ограничить область, если есть контейнер.
-      const html = document.documentElement.outerHTML;
-
-      const res = await fetch('/export', {
-        method: 'POST',
-        headers: {'Content-Type': 'application/x-www-form-urlencoded'},
-        body: new URLSearchParams({ html, format: fmt })
-      });
-
-      if (!res.ok) {
-        const err = await res.json().catch(() => ({}));
-        throw new Error(err.error || `HTTP ${res.status}`);
+      // Шлём компактный черновик — сервер сам отрендерит result.html.
+      // Фолбэк на весь HTML страницы, если черновика нет (старые вкладки).
+      let draft = null;
+      try { draft = JSON.parse(localStorage.getItem('wh_draft_v1')); } catch (_) {}
+
+      // ?async=1 — рендер идёт фоновым заданием, дальше опрашиваем статус
+      const submit = draft
+        ? await fetch('/export/draft?async=1', {
+            method: 'POST',
+            ...await postBody(JSON.stringify({ draft, format: fmt }), 'application/json')
+          })
+        : await fetch('/export?async=1', {
+            method: 'POST',
+            ...await postBody(
+              new URLSearchParams({ html: document.documentElement.outerHTML, format: fmt }).toString(),
+              'application/x-www-form-urlencoded'
+            )
+          });
+
+      if (!submit.ok) {
+        const err = await submit.json().catch(() => ({}));
+        throw new Error(err.error || `HTTP ${submit.status}`);
       }
 
+      const res = await waitForJob(await submit.json());
       const blob = await res.blob();
       const url  = URL.createObjectURL(blob);
 
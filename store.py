@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from timesheet import Shift, Timesheet
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS employees (
+    id          INTEGER PRIMARY KEY,
+    last_name   TEXT NOT NULL,
+    first_name  TEXT NOT NULL,
+    UNIQUE (last_name, first_name)
+);
+CREATE TABLE IF NOT EXISTS shifts (
+    id          INTEGER PRIMARY KEY,
+    employee_id INTEGER NOT NULL REFERENCES employees(id),
+    work_date   TEXT NOT NULL,          -- YYYY-MM-DD, локальная дата начала смены
+    start       TEXT NOT NULL,          -- HH:MM
+    "end"       TEXT NOT NULL,          -- HH:MM
+    minutes     INTEGER NOT NULL,
+    dst         INTEGER NOT NULL,
+    tz          TEXT NOT NULL,
+    UNIQUE (employee_id, work_date, start)
+);
+CREATE INDEX IF NOT EXISTS shifts_emp_date ON shifts(employee_id, work_date);
+CREATE INDEX IF NOT EXISTS shifts_dst ON shifts(work_date) WHERE dst = 1;
+
+-- итоги обновляются инкрементально при каждой вставке/правке смены
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    employee_id INTEGER NOT NULL,
+    work_date   TEXT NOT NULL,
+    minutes     INTEGER NOT NULL,
+    shifts      INTEGER NOT NULL,
+    dst_shifts  INTEGER NOT NULL,
+    PRIMARY KEY (employee_id, work_date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS daily_rollups_date ON daily_rollups(work_date);
+CREATE TABLE IF NOT EXISTS period_rollups (
+    employee_id  INTEGER NOT NULL,
+    period_start TEXT NOT NULL,
+    minutes      INTEGER NOT NULL,
+    shifts       INTEGER NOT NULL,
+    dst_shifts   INTEGER NOT NULL,
+    PRIMARY KEY (employee_id, period_start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS period_rollups_start ON period_rollups(period_start);
+"""
+
+_ROLLUP_UPSERT = """
+INSERT INTO {table} (employee_id, {col}, minutes, shifts, dst_shifts) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (employee_id, {col}) DO UPDATE SET
+    minutes = minutes + excluded.minutes,
+    shifts = shifts + excluded.shifts,
+    dst_shifts = dst_shifts + excluded.dst_shifts
+"""
+
+
+class TimesheetStore:
+    """
+    Серверное хранилище сотрудников и смен (SQLite).
+
+    Дневные итоги и итоги по расчётным периодам (PAY_PERIOD_DAYS дней от
+    PAY_PERIOD_ANCHOR) поддерживаются дельтами, поэтому запросы по диапазону
+    читают rollup-таблицы, а не все смены.
+    """
+
+    def __init__(self, db_path: str, period_days: int = 14, period_anchor: date = date(2025, 1, 6)):
+        self.db_path = db_path
+        self.period_days = max(1, period_days)
+        self.period_anchor = period_anchor
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> "TimesheetStore | None":
+        """
+        Только если задан TIMESHEET_DB: без авторизации /api/shifts и
+        /api/employees открыты всем, поэтому хранилище включается явно.
+        """
+        db_path = os.environ.get("TIMESHEET_DB")
+        if not db_path:
+            return None
+        return cls(
+            db_path=db_path,
+            period_days=int(os.environ.get("PAY_PERIOD_DAYS", 14)),
+            period_anchor=date.fromisoformat(os.environ.get("PAY_PERIOD_ANCHOR", "2025-01-06")),
+        )
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def period_start(self, d: date) -> date:
+        n = (d - self.period_anchor).days // self.period_days
+        try:
+            return self.period_anchor + timedelta(days=n * self.period_days)
+        except OverflowError:
+            return date.min  # период, начавшийся бы до 0001-01-01
+
+    def period_end(self, start: date) -> date:
+        try:
+            return start + timedelta(days=self.period_days - 1)
+        except OverflowError:
+            return date.max
+
+    # ---------- запись ----------
+    def _employee_id(self, db: sqlite3.Connection, first_name: str, last_name: str) -> int:
+        db.execute(
+            "INSERT INTO employees (last_name, first_name) VALUES (?, ?) ON CONFLICT DO NOTHING",
+            (last_name, first_name),
+        )
+        return db.execute(
+            "SELECT id FROM employees WHERE last_name = ? AND first_name = ?", (last_name, first_name),
+        ).fetchone()["id"]
+
+    def _apply(self, db: sqlite3.Connection, employee_id: int, work_date: str,
+               minutes: int, shifts: int, dst_shifts: int) -> None:
+        period = self.period_start(date.fromisoformat(work_date)).isoformat()
+        args = (minutes, shifts, dst_shifts)
+        db.execute(_ROLLUP_UPSERT.format(table="daily_rollups", col="work_date"), (employee_id, work_date, *args))
+        db.execute(_ROLLUP_UPSERT.format(table="period_rollups", col="period_start"), (employee_id, period, *args))
+
+    def _remove(self, db: sqlite3.Connection, row: sqlite3.Row) -> None:
+        db.execute("DELETE FROM shifts WHERE id = ?", (row["id"],))
+        self._apply(db, row["employee_id"], row["work_date"], -row["minutes"], -1, -row["dst"])
+
+    def _upsert(self, db: sqlite3.Connection, employee_id: int, s: Shift, tz_name: str) -> str:
+        work_date = s.day.isoformat()
+        start, end = f"{s.sh:02d}:{s.sm:02d}", f"{s.eh:02d}:{s.em:02d}"
+        old = db.execute(
+            'SELECT id, employee_id, work_date, "end", minutes, dst, tz FROM shifts '
+            "WHERE employee_id = ? AND work_date = ? AND start = ?",
+            (employee_id, work_date, start),
+        ).fetchone()
+        if old is not None:
+            if (old["end"], old["minutes"], old["dst"], old["tz"]) == (end, s.minutes, int(s.dst), tz_name):
+                return "unchanged"
+            db.execute(
+                'UPDATE shifts SET "end" = ?, minutes = ?, dst = ?, tz = ? WHERE id = ?',
+                (end, s.minutes, int(s.dst), tz_name, old["id"]),
+            )
+            self._apply(db, employee_id, work_date, s.minutes - old["minutes"], 0, int(s.dst) - old["dst"])
+            return "updated"
+        db.execute(
+            'INSERT INTO shifts (employee_id, work_date, start, "end", minutes, dst, tz) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (employee_id, work_date, start, end, s.minutes, int(s.dst), tz_name),
+        )
+        self._apply(db, employee_id, work_date, s.minutes, 1, int(s.dst))
+        return "inserted"
+
+    def save_timesheet(self, first_name: str, last_name: str, ts: Timesheet) -> dict:
+        """
+        Смены из /build или черновика заменяют сохранённые смены сотрудника
+        за те же даты: совпавшие по (дата, начало) обновляются на месте (id
+        сохраняется), остальные смены этих дат удаляются с откатом итогов.
+        """
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        if not (first_name or last_name):
+            return {"employee_id": None, **counts}
+        keep = {(s.day.isoformat(), f"{s.sh:02d}:{s.sm:02d}") for s in ts.shifts}
+        dates = {d for d, _ in keep}
+        with self._tx() as db:
+            employee_id = self._employee_id(db, first_name, last_name)
+            if dates:
+                rows = db.execute(
+                    "SELECT * FROM shifts WHERE employee_id = ? AND work_date BETWEEN ? AND ?",
+                    (employee_id, min(dates), max(dates)),
+                ).fetchall()
+                for row in rows:
+                    if row["work_date"] in dates and (row["work_date"], row["start"]) not in keep:
+                        self._remove(db, row)
+                        counts["deleted"] += 1
+            for s in ts.shifts:
+                counts[self._upsert(db, employee_id, s, ts.tz_name)] += 1
+        return {"employee_id": employee_id, **counts}
+
+    def edit_shift(self, shift_id: int, row: dict) -> dict | None:
+        """Правка смены (date/start/end в формате черновика). None — нет такой смены."""
+        with self._tx() as db:
+            old = db.execute("SELECT * FROM shifts WHERE id = ?", (shift_id,)).fetchone()
+            if old is None:
+                return None
+            merged = {"date": old["work_date"], "start": old["start"], "end": old["end"], **row}
+            ts = Timesheet.from_draft_rows(row.get("tz") or old["tz"], [merged])
+            if not ts.shifts:
+                raise ValueError("invalid date/start/end")
+            s = ts.shifts[0]
+            work_date = s.day.isoformat()
+            try:
+                db.execute(
+                    'UPDATE shifts SET work_date = ?, start = ?, "end" = ?, minutes = ?, dst = ?, tz = ? WHERE id = ?',
+                    (work_date, f"{s.sh:02d}:{s.sm:02d}", f"{s.eh:02d}:{s.em:02d}",
+                     s.minutes, int(s.dst), ts.tz_name, shift_id),
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError("another shift already starts at this date and time")
+            # старый вклад вычитаем, новый добавляем (дата могла смениться)
+            self._apply(db, old["employee_id"], old["work_date"], -old["minutes"], -1, -old["dst"])
+            self._apply(db, old["employee_id"], work_date, s.minutes, 1, int(s.dst))
+            new = db.execute("SELECT * FROM shifts WHERE id = ?", (shift_id,)).fetchone()
+        return dict(new)
+
+    def delete_shift(self, shift_id: int) -> bool:
+        with self._tx() as db:
+            old = db.execute("SELECT * FROM shifts WHERE id = ?", (shift_id,)).fetchone()
+            if old is None:
+                return False
+            self._remove(db, old)
+        return True
+
+    # ---------- запросы ----------
+    def employees(self) -> list[dict]:
+        with self._connect() as db:
+            rows = db.execute("SELECT id, last_name, first_name FROM employees ORDER BY last_name, first_name")
+            return [dict(r) for r in rows]
+
+    def range_totals(self, date_from: str, date_to: str, employee_id: int | None = None) -> list[dict]:
+        """Итоги по сотрудникам за [date_from, date_to] из дневных rollup-ов."""
+        sql = (
+            "SELECT e.id AS employee_id, e.last_name, e.first_name, "
+            "SUM(r.minutes) AS minutes, SUM(r.shifts) AS shifts, SUM(r.dst_shifts) AS dst_shifts "
+            "FROM daily_rollups r JOIN employees e ON e.id = r.employee_id "
+            "WHERE r.work_date BETWEEN ? AND ? AND r.shifts > 0"
+        )
+        args: list = [date_from, date_to]
+        if employee_id is not None:
+            sql += " AND r.employee_id = ?"
+            args.append(employee_id)
+        sql += " GROUP BY e.id ORDER BY e.last_name, e.first_name"
+        with self._connect() as db:
+            return [dict(r) for r in db.execute(sql, args)]
+
+    def period_totals(self, date_from: str, date_to: str, employee_id: int | None = None) -> list[dict]:
+        """Итоги по расчётным периодам, чьё начало попадает в диапазон."""
+        lo = self.period_start(date.fromisoformat(date_from)).isoformat()
+        sql = (
+            "SELECT employee_id, period_start, minutes, shifts, dst_shifts FROM period_rollups "
+            "WHERE period_start BETWEEN ? AND ? AND shifts > 0"
+        )
+        args: list = [lo, date_to]
+        if employee_id is not None:
+            sql += " AND employee_id = ?"
+            args.append(employee_id)
+        sql += " ORDER BY period_start, employee_id"
+        with self._connect() as db:
+            rows = [dict(r) for r in db.execute(sql, args)]
+        for r in rows:
+            r["period_end"] = self.period_end(date.fromisoformat(r["period_start"])).isoformat()
+        return rows
+
+    def overtime(self, date_from: str, date_to: str, weekly_limit_minutes: int = 40 * 60,
+                 employee_id: int | None = None) -> list[dict]:
+        """Переработка по неделям (пн–вс) сверх weekly_limit_minutes."""
+        week = "date(r.work_date, '-' || ((CAST(strftime('%w', r.work_date) AS INTEGER) + 6) % 7) || ' days')"
+        sql = (
+            f"SELECT r.employee_id, {week} AS week_start, SUM(r.minutes) AS minutes "
+            "FROM daily_rollups r WHERE r.work_date BETWEEN ? AND ?"
+        )
+        args: list = [date_from, date_to]
+        if employee_id is not None:
+            sql += " AND r.employee_id = ?"
+            args.append(employee_id)
+        sql += " GROUP BY r.employee_id, week_start HAVING SUM(r.minutes) > ? ORDER BY week_start, r.employee_id"
+        args.append(weekly_limit_minutes)
+        with self._connect() as db:
+            rows = [dict(r) for r in db.execute(sql, args)]
+        for r in rows:
+            r["overtime_minutes"] = r["minutes"] - weekly_limit_minutes
+        return rows
+
+    def dst_shifts(self, date_from: str, date_to: str, employee_id: int | None = None,
+                   limit: int = 1000) -> list[dict]:
+        sql = (
+            'SELECT id, employee_id, work_date, start, "end", minutes, tz FROM shifts '
+            "WHERE dst = 1 AND work_date BETWEEN ? AND ?"
+        )
+        args: list = [date_from, date_to]
+        if employee_id is not None:
+            sql += " AND employee_id = ?"
+            args.append(employee_id)
+        sql += " ORDER BY work_date, id LIMIT ?"
+        args.append(limit)
+        with self._connect() as db:
+            return [dict(r) for r in db.execute(sql, args)]
@@ -0,0 +1,61 @@
+import io
+from datetime import date
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from importers import iter_csv, iter_ics
+
+CHICAGO = ZoneInfo("America/Chicago")
+
+
+def _csv(text):
+    return list(iter_csv(io.StringIO(text)))
+
+
+def _ics(*events, tz=CHICAGO):
+    lines = []
+    for props in events:
+        lines += ["BEGIN:VEVENT", *props, "END:VEVENT"]
+    return [(shift, err) for _, shift, err in iter_ics(lines, tz)]
+
+
+@pytest.mark.parametrize("header", ["Date,Start,End,Hours", "Date,Shift,Start,End", "date,in,out"])
+def test_csv_prefers_start_end_columns(header):
+    cols = header.split(",")
+    values = {"date": "2025-01-02", "start": "09:00", "in": "09:00", "end": "17:00", "out": "17:00",
+              "hours": "8", "shift": "Morning"}
+    row = ",".join(values[c.lower()] for c in cols)
+    assert _csv(f"{header}\n{row}\n") == [(2, (date(2025, 1, 2), 9, 0, 17, 0), None)]
+
+
+def test_csv_range_column_and_headerless_rows():
+    assert _csv("Date,Time\n01/02/2025,10:00 pm - 6:00 am\n") == [(2, (date(2025, 1, 2), 22, 0, 6, 0), None)]
+    assert _csv("2025-01-02,9:00 am,5:00 pm\n2025-13-01,09:00,17:00\n2025-01-03,25:00,17:00\n") == [
+        (1, (date(2025, 1, 2), 9, 0, 17, 0), None),
+        (2, None, "bad_date"),
+        (3, None, "bad_time"),
+    ]
+
+
+def test_ics_converts_utc_and_duration():
+    assert _ics(
+        ["DTSTART:20250601T140000Z", "DTEND:20250601T220000Z"],
+        ["DTSTART;TZID=America/Chicago:20250601T220000", "DURATION:PT8H"],
+    ) == [((date(2025, 6, 1), 9, 0, 17, 0), None), ((date(2025, 6, 1), 22, 0, 6, 0), None)]
+
+
+@pytest.mark.parametrize("props, error", [
+    (["DTSTART:20250101T250000", "DTEND:20250101T260000"], "bad_datetime"),
+    (["DTSTART:20250101T096000Z", "DTEND:20250101T170000Z"], "bad_datetime"),
+    (["DTSTART;TZID=Europe/Berlin:20250101T090061", "DTEND:20250101T170000"], "bad_datetime"),
+    (["DTSTART;TZID=Asia/Tokyo:00010101T010000", "DTEND;TZID=Asia/Tokyo:00010101T090000"], "bad_datetime"),
+    (["DTSTART:20250101T090000", "DURATION:PT99999999999H"], "bad_duration"),
+    (["DTSTART:99991231T220000", "DURATION:PT8H"], "bad_duration"),
+    (["DTSTART:20250101T090000", "DTEND:20250101T090030"], "bad_range"),
+    (["DTSTART;TZID=America/Chicago:20251102T013000", "DTEND:20251102T073000Z"], "bad_range"),
+    (["DTSTART:20250101T090000", "DTEND:20250101T170000", "RRULE:FREQ=WEEKLY"], "recurring_event_not_expanded"),
+    (["DTSTART;VALUE=DATE:20250101"], "all_day_event"),
+])
+def test_ics_bad_events_are_line_errors(props, error):
+    assert _ics(props) == [(None, error)]
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), ttl=60, heartbeat=0.05)
+
+
+def _wait(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while queue.status(job_id)["status"] in ("queued", "running"):
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return queue.status(job_id)
+
+
+def test_job_of_dead_worker_is_failed_and_resubmitted(queue):
+    old = time.time() - 60
+    with queue._connect() as db:
+        db.execute(
+            "INSERT INTO jobs (id, key, status, owner, heartbeat, created_at) "
+            "VALUES ('lost', 'k', 'running', 1, ?, ?)",
+            (old, old),
+        )
+    job = queue.status("lost")
+    assert (job["status"], job["error"]) == ("failed", {"error": "worker_lost"})
+
+    job_id = queue.submit("k", lambda: (b"pdf", {}), "application/pdf", "x.pdf")
+    assert job_id != "lost"
+    assert _wait(queue, job_id)["status"] == "done"
+
+
+def test_running_job_keeps_heartbeat(queue):
+    job_id = queue.submit("k", lambda: (time.sleep(0.4), (b"pdf", {}))[1], "application/pdf", "x.pdf")
+    time.sleep(0.25)  # дольше трёх интервалов heartbeat
+    assert queue.status(job_id)["status"] in ("queued", "running")
+    assert queue.submit("k", lambda: (b"other", {}), "application/pdf", "x.pdf") == job_id
+    assert _wait(queue, job_id)["status"] == "done"
+
+
+def test_ttl_counts_from_finish(queue):
+    job_id = queue.submit("k", lambda: (b"pdf", {}), "application/pdf", "x.pdf")
+    job = _wait(queue, job_id)
+    assert job["expires_at"] == pytest.approx(job["finished_at"] + 60)
+    assert queue.result(job_id)[0] == b"pdf"
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+from store import TimesheetStore
+from timesheet import Timesheet
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimesheetStore(str(tmp_path / "ts.sqlite3"))
+
+
+def _sheet(*rows, tz="America/Chicago"):
+    return Timesheet.from_draft_rows(tz, [{"date": d, "start": s, "end": e} for d, s, e in rows])
+
+
+def test_resubmit_with_changed_start_replaces_shift(store):
+    store.save_timesheet("Jane", "Doe", _sheet(("2025-06-10", "09:00", "17:00")))
+    res = store.save_timesheet("Jane", "Doe", _sheet(("2025-06-10", "09:30", "17:00")))
+    assert (res["inserted"], res["deleted"]) == (1, 1)
+
+    [row] = store.range_totals("2025-06-01", "2025-06-30")
+    assert (row["minutes"], row["shifts"]) == (450, 1)
+    [period] = store.period_totals("2025-06-01", "2025-06-30")
+    assert (period["minutes"], period["shifts"]) == (450, 1)
+
+
+def test_resubmit_keeps_other_dates_and_ids(store):
+    store.save_timesheet("Jane", "Doe", _sheet(("2025-06-10", "09:00", "17:00"), ("2025-06-11", "09:00", "12:00")))
+    res = store.save_timesheet("Jane", "Doe", _sheet(("2025-06-11", "09:00", "13:00")))
+    assert (res["updated"], res["deleted"]) == (1, 0)
+    [row] = store.range_totals("2025-06-01", "2025-06-30")
+    assert (row["minutes"], row["shifts"]) == (480 + 240, 2)
+
+
+def test_rollups_follow_edit_and_delete(store):
+    store.save_timesheet("Jane", "Doe", _sheet(("2025-11-01", "22:00", "06:00")))
+    [shift] = store.dst_shifts("2025-11-01", "2025-11-01")
+    assert shift["minutes"] == 9 * 60
+
+    store.edit_shift(shift["id"], {"date": "2025-11-05"})
+    assert store.range_totals("2025-11-01", "2025-11-01") == []
+    [row] = store.range_totals("2025-11-05", "2025-11-05")
+    assert (row["minutes"], row["dst_shifts"]) == (8 * 60, 0)
+
+    assert store.delete_shift(shift["id"])
+    assert store.range_totals("0001-01-01", "9999-12-31") == []
+
+
+def test_period_start_is_anchored(store):
+    assert store.period_start(date(2025, 1, 6)) == date(2025, 1, 6)
+    assert store.period_start(date(2025, 1, 19)) == date(2025, 1, 6)
+    assert store.period_start(date(2025, 1, 20)) == date(2025, 1, 20)
+
+
+def test_period_bounds_clamp_at_calendar_edges(tmp_path):
+    store = TimesheetStore(str(tmp_path / "ts.sqlite3"), period_days=10)
+    assert store.period_start(date.min) == date.min
+    assert store.period_totals("0001-01-01", "9999-12-31") == []
+    assert store.period_end(date(9999, 12, 28)) == date.max
@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+
+import timesheet
+from timesheet import Timesheet, zone_offsets
+
+
+def test_zone_offset_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(timesheet, "ZONE_CACHE_DAYS", 100)
+    ts = Timesheet("Europe/Berlin")
+    for i in range(1000):
+        ts.add(date(2000, 1, 1) + timedelta(days=i), 9, 0, 17, 0)
+    assert len(zone_offsets(ts.tz)._days) <= 100
+    assert {s.minutes for s in ts.shifts} == {480}
+
+
+def test_overnight_shift_at_calendar_edges():
+    ts = Timesheet("America/Chicago")
+    assert ts.add(date.max, 22, 0, 6, 0).minutes == 480
+    assert ts.add(date.min, 22, 0, 6, 0).minutes == 480
+
+
+def test_dst_change_is_counted():
+    ts = Timesheet("America/Chicago")
+    shift = ts.add(date(2025, 11, 1), 22, 0, 6, 0)
+    assert (shift.minutes, shift.dst) == (9 * 60, True)
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import os
+import re
+from datetime import datetime, timedelta, date, timezone
+from functools import lru_cache
+from typing import Iterable
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+DEFAULT_TZ = "America/Chicago"
+UTC = timezone.utc
+
+TIME_RGX = re.compile(
+    r"^\s*(\d{1,2}):(\d{2})\s*([ap]m)\s*[-–—]\s*(\d{1,2}):(\d{2})\s*([ap]m)\s*$",
+    re.IGNORECASE,
+)
+DATE_RGX = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+HHMM_RGX = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*$")
+
+
+def to_24h(hour12: int, minute: int, ampm: str) -> tuple[int, int]:
+    ampm = ampm.lower()
+    h = hour12 % 12
+    if ampm == "pm":
+        h += 12
+    return h, minute
+
+
+def parse_range(date_obj: datetime, rng: str, tz: ZoneInfo) -> tuple[datetime, datetime, int, int, bool]:
+    m = TIME_RGX.match(rng)
+    if not m:
+        raise ValueError("Time range must be like '3:52 pm - 1:11 am'")
+    sh, sm, sa, eh, em, ea = m.groups()
+    sh, sm, eh, em = int(sh), int(sm), int(eh), int(em)
+    sh24, sm = to_24h(sh, sm, sa)
+    eh24, em = to_24h(eh, em, ea)
+
+    start_local = datetime(date_obj.year, date_obj.month, date_obj.day, sh24, sm, tzinfo=tz)
+    end_local   = datetime(date_obj.year, date_obj.month, date_obj.day, eh24, em, tzinfo=tz)
+    if end_local <= start_local:
+        end_local += timedelta(days=1)
+
+    minutes_total = int(
+        (end_local.astimezone(UTC) - start_local.astimezone(UTC)).total_seconds() // 60
+    )
+    h, m = divmod(minutes_total, 60)
+
+    dst_adjusted = start_local.utcoffset() != end_local.utcoffset()
+    return start_local, end_local, h, m, dst_adjusted
+
+
+def day_name(dt: datetime) -> str:
+    return dt.strftime("%A")
+
+
+def _fmt_month_day(d: date) -> str:
+    return f"{d.strftime('%B')} {d.strftime('%d').lstrip('0')}"
+
+
+def make_period_title(dates: list[date]) -> str:
+    """
+    'October 25 – 31, 2025' | 'October 25 – November 3, 2025' | 'October 25, 2025 – November 3, 2026'
+    """
+    lo, hi = min(dates), max(dates)
+    if lo.year == hi.year:
+        if lo.month == hi.month:
+            return f"{_fmt_month_day(lo)} – {hi.strftime('%d').lstrip('0')}, {lo.year}"
+        return f"{_fmt_month_day(lo)} – {_fmt_month_day(hi)}, {lo.year}"
+    return f"{_fmt_month_day(lo)}, {lo.year} – {_fmt_month_day(hi)}, {hi.year}"
+
+
+# ---------- зоны ----------
+@lru_cache(maxsize=64)
+def _zone(name: str) -> ZoneInfo | None:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def resolve_tz(tz_name: str | None) -> tuple[str, ZoneInfo]:
+    """Тайм-зона из формы/черновика + безопасный фолбэк (имя возвращаем как пришло)."""
+    tz_name = (tz_name or "").strip() or os.environ.get("DEFAULT_TZ", DEFAULT_TZ)
+    return tz_name, _zone(tz_name) or _zone(DEFAULT_TZ)
+
+
+ZONE_CACHE_DAYS = 4096  # дни на зону; даты выбирает клиент, так что кэш ограничен
+
+
+class ZoneOffsets:
+    """
+    UTC-смещения зоны с кэшем по дням.
+
+    Если смещение в 00:00 дня и в 00:00 следующего совпадает, перехода внутри
+    дня нет — всё время в этот день имеет одно смещение. Точный расчёт через
+    datetime нужен только в дни перевода часов. Кэш не больше ZONE_CACHE_DAYS
+    дней: при переполнении сбрасывается целиком.
+    """
+
+    __slots__ = ("tz", "_days")
+
+    def __init__(self, tz: ZoneInfo):
+        self.tz = tz
+        self._days: dict[int, tuple[int, int]] = {}
+
+    def _offset(self, d: date, h: int = 0, m: int = 0) -> int:
+        return int(datetime(d.year, d.month, d.day, h, m, tzinfo=self.tz).utcoffset().total_seconds())
+
+    def at(self, d: date, h: int, m: int) -> int:
+        key = d.toordinal()
+        day = self._days.get(key)
+        if day is None:
+            if len(self._days) >= ZONE_CACHE_DAYS:
+                self._days.clear()
+            # у 9999-12-31 следующего дня нет — берём конец этого же дня
+            nxt = self._offset(d + timedelta(days=1)) if d < date.max else self._offset(d, 23, 59)
+            day = self._days[key] = (self._offset(d), nxt)
+        if day[0] == day[1]:
+            return day[0]
+        return self._offset(d, h, m)
+
+
+@lru_cache(maxsize=64)
+def zone_offsets(tz: ZoneInfo) -> ZoneOffsets:
+    return ZoneOffsets(tz)
+
+
+@lru_cache(maxsize=4096)
+def _date_labels(ordinal: int) -> tuple[str, str]:
+    d = date.fromordinal(ordinal)
+    return d.strftime("%m/%d/%Y"), d.strftime("%A")
+
+
+@lru_cache(maxsize=24 * 60)
+def _clock_label(h: int, m: int) -> str:
+    # то же, что strftime('%I:%M %p').lstrip('0').lower()
+    return f"{(h + 11) % 12 + 1}:{m:02d} {'pm' if h >= 12 else 'am'}"
+
+
+# ---------- разбор строк ----------
+def parse_date(d_str: str) -> date | None:
+    m = DATE_RGX.match(d_str)
+    if not m:
+        return None
+    try:
+        return date(int(m[1]), int(m[2]), int(m[3]))
+    except ValueError:
+        return None
+
+
+def parse_hhmm(s: str) -> tuple[int, int] | None:
+    m = HHMM_RGX.match(s)
+    if not m:
+        return None
+    h, mi = int(m[1]), int(m[2])
+    if h > 23 or mi > 59:
+        return None
+    return h, mi
+
+
+def parse_range_hm(rng: str) -> tuple[int, int, int, int] | None:
+    m = TIME_RGX.match(rng)
+    if not m:
+        return None
+    sh, sm, sa, eh, em, ea = m.groups()
+    sh24, sm = to_24h(int(sh), int(sm), sa)
+    eh24, em = to_24h(int(eh), int(em), ea)
+    if sm > 59 or em > 59:
+        return None
+    return sh24, sm, eh24, em
+
+
+def totals_of(subtotal_h: int, subtotal_m: int, dst_note: bool) -> dict:
+    """Итоги как в result.html: часы и минуты смен суммируются раздельно, минуты потом переносятся."""
+    m_to_h, m_rem = divmod(subtotal_m, 60)
+    return {
+        "subtotal_h": subtotal_h,
+        "subtotal_m": subtotal_m,
+        "subtotal_m_as_h": m_to_h,
+        "subtotal_m_rem": m_rem,
+        "total_h": subtotal_h + m_to_h,
+        "total_m": f"{m_rem:02d}",
+        "dst_note": dst_note,
+    }
+
+
+class Shift:
+    """Одна смена: только числа, подписи считаются при выводе."""
+
+    __slots__ = ("day", "sh", "sm", "eh", "em", "minutes", "dst")
+
+    def __init__(self, day: date, sh: int, sm: int, eh: int, em: int, offsets: ZoneOffsets):
+        self.day = day
+        self.sh, self.sm, self.eh, self.em = sh, sm, eh, em
+        start = sh * 60 + sm
+        end = eh * 60 + em
+        end_day = day
+        if end <= start:
+            end += 24 * 60
+            end_day = day + timedelta(days=1) if day < date.max else day
+        off_start = offsets.at(day, sh, sm)
+        off_end = offsets.at(end_day, eh, em)
+        # длительность в UTC = «настенная» разница минус сдвиг смещения
+        self.minutes = ((end - start) * 60 - (off_end - off_start)) // 60
+        self.dst = off_start != off_end
+
+    @property
+    def h(self) -> int:
+        return self.minutes // 60
+
+    @property
+    def m(self) -> int:
+        return self.minutes % 60
+
+    def row(self) -> dict:
+        date_label, day_label = _date_labels(self.day.toordinal())
+        return {
+            "date": date_label,
+            "day":  day_label,
+            "time_label": f"{_clock_label(self.sh, self.sm)} – {_clock_label(self.eh, self.em)}",
+            "h": self.h,
+            "m": f"{self.m:02d}",
+            "dst": self.dst,
+        }
+
+
+class Timesheet:
+    """Набор смен в одной зоне + итоги в один проход; общий движок /build и черновиков."""
+
+    __slots__ = ("tz_name", "tz", "shifts")
+
+    def __init__(self, tz_name: str | None):
+        self.tz_name, self.tz = resolve_tz(tz_name)
+        self.shifts: list[Shift] = []
+
+    @classmethod
+    def from_ranges(cls, tz_name: str | None, pairs: Iterable[tuple[str, str]]) -> "Timesheet":
+        """Поля формы: date[] ('YYYY-MM-DD') + range[] ('3:52 pm - 1:11 am'). Плохие строки пропускаем."""
+        ts = cls(tz_name)
+        offsets = zone_offsets(ts.tz)
+        append = ts.shifts.append
+        for d_str, r_str in pairs:
+            d = parse_date((d_str or "").strip())
+            hm = d and parse_range_hm((r_str or "").strip())
+            if hm:
+                append(Shift(d, *hm, offsets))
+        return ts
+
+    @classmethod
+    def from_draft_rows(cls, tz_name: str | None, rows: Iterable[dict]) -> "Timesheet":
+        """Строки черновика wh_draft_v1: {date, start: 'HH:MM', end: 'HH:MM'}."""
+        ts = cls(tz_name)
+        offsets = zone_offsets(ts.tz)
+        append = ts.shifts.append
+        for row in rows:
+            d = parse_date((row.get("date") or "").strip())
+            s = d and parse_hhmm(row.get("start") or "")
+            e = s and parse_hhmm(row.get("end") or "")
+            if e:
+                append(Shift(d, *s, *e, offsets))
+        return ts
+
+    def add(self, day: date, sh: int, sm: int, eh: int, em: int) -> Shift:
+        shift = Shift(day, sh, sm, eh, em, zone_offsets(self.tz))
+        self.shifts.append(shift)
+        return shift
+
+    def sorted_shifts(self) -> list[Shift]:
+        # стабильная сортировка только по дате — как раньше в /build
+        return sorted(self.shifts, key=lambda s: s.day)
+
+    def totals(self) -> dict:
+        subtotal_h = subtotal_m = 0
+        dst_note = False
+        for s in self.shifts:
+            h, m = divmod(s.minutes, 60)
+            subtotal_h += h
+            subtotal_m += m
+            dst_note = dst_note or s.dst
+        return totals_of(subtotal_h, subtotal_m, dst_note)
+
+    def context(self, first_name: str, last_name: str, year: int) -> dict:
+        """Контекст для result.html."""
+        shifts = self.sorted_shifts()
+        if shifts:
+            period_title = make_period_title([shifts[0].day, shifts[-1].day])
+            title_str = f"{first_name} {last_name} — Work Hours ({period_title})"
+        else:
+            title_str = f"{first_name} {last_name} — Work Hours ({year})"
+
+        return {
+            "title": title_str,
+            "last_name": last_name,
+            "first_name": first_name,
+            "year": year,
+            "rows": [s.row() for s in shifts],
+            **self.totals(),
+            "tz_name": self.tz_name,
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        }